@@ -0,0 +1,125 @@
+# answer_service.py
+
+import asyncio
+import queue
+import threading
+
+from config import GROQ_MAX_CONCURRENCY
+
+_DONE = object()
+
+
+class AnswerHandle:
+    """
+    Caller-side view of one in-flight answer. Partial answers are queued by
+    the event loop thread so that the caller (e.g. the Streamlit script
+    thread, which must do its own rendering) can consume them with
+    `partials()`; `result()` waits for the final pipeline result.
+    """
+
+    def __init__(self):
+        self.future = None
+        self._partials = queue.Queue()
+
+    def _on_token(self, partial):
+        self._partials.put(partial)
+
+    def _finish(self, _future):
+        self._partials.put(_DONE)
+
+    def partials(self):
+        """Yield partial answers until the request completes"""
+        while True:
+            item = self._partials.get()
+            if item is _DONE:
+                return
+            # Skip to the newest partial when the renderer falls behind
+            while True:
+                try:
+                    newer = self._partials.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is _DONE:
+                    yield item
+                    return
+                item = newer
+            yield item
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        return self.future.cancel()
+
+
+class AnswerService:
+    """
+    Asyncio answering service, independent of Streamlit.
+
+    Runs its own event loop in a daemon thread. Each request runs the
+    pipeline's awaitable stages as a task; concurrent LLM calls are bounded
+    by a semaphore sized to the Groq rate limit, and submitting a new
+    question for a session cancels that session's previous request.
+    """
+
+    def __init__(self, pipeline_factory, max_concurrency=GROQ_MAX_CONCURRENCY):
+        self.pipeline_factory = pipeline_factory
+        self.max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._llm_limiter = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run_loop, name="answer-service", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._llm_limiter = asyncio.Semaphore(self.max_concurrency)
+        self._loop.run_forever()
+
+    async def answer(self, question, prompt, memory, answer_type=None, on_token=None, summary=None, corpora=None):
+        """
+        Awaitable entry point for callers already running on this service's
+        loop. `corpora` selects the collections to search (default: all).
+        """
+        # Building a pipeline may wait for the model warm-up; keep the loop serving other sessions
+        pipeline = await asyncio.to_thread(self.pipeline_factory, corpora)
+        return await pipeline.aanswer(
+            question, prompt, memory, answer_type,
+            on_token=on_token, llm_limiter=self._llm_limiter, summary=summary
+        )
+
+    def submit(self, session_id, question, prompt, memory, answer_type=None, summary=None, corpora=None):
+        """
+        Schedule an answer from any thread and return an AnswerHandle.
+        A still-running request from the same session is cancelled.
+        """
+        handle = AnswerHandle()
+        coroutine = self.answer(
+            question, prompt, memory, answer_type, on_token=handle._on_token, summary=summary, corpora=corpora
+        )
+        with self._lock:
+            previous = self._inflight.get(session_id)
+            handle.future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+            self._inflight[session_id] = handle.future
+        # Outside the lock: cancelling runs the previous request's done callbacks
+        if previous is not None:
+            previous.cancel()
+        handle.future.add_done_callback(handle._finish)
+        handle.future.add_done_callback(lambda future: self._forget(session_id, future))
+        return handle
+
+    def _forget(self, session_id, future):
+        with self._lock:
+            if self._inflight.get(session_id) is future:
+                del self._inflight[session_id]
+
+    def cancel(self, session_id):
+        """Cancel the in-flight request of a session, if any"""
+        with self._lock:
+            future = self._inflight.pop(session_id, None)
+        return future.cancel() if future is not None else False
+
+    def inflight(self):
+        with self._lock:
+            return len(self._inflight)
@@ -0,0 +1,291 @@
+# benchmark.py
+#
+# Offline retrieval/answer benchmark. Runs a question file through the real
+# ingestion, retrieval and prompt-packing code with a local extractive stub
+# in place of Groq and writes a JSON result file for regression comparison:
+#
+#   python benchmark.py --corpus data.zip --questions questions.jsonl --output bench.json
+#   python benchmark.py ... --baseline bench.json   # exit 1 on a quality regression
+#
+# Each line of the question file is {"question": ..., "answer": ...} with an
+# optional "sources": [archive member names that answer it] for recall/MRR.
+# No network is used: Hugging Face models must already be in the local cache,
+# or pass --hashing-embeddings to run without any model at all.
+
+import os
+
+# Must be set before transformers / huggingface_hub are imported
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import numpy as np
+from langchain.prompts import PromptTemplate
+
+from chunking import Chunker
+from config import EMBED_MODEL, RETRIEVER_K, RETRIEVAL_MODE, VECTOR_INDEX_MODE
+from corpora import build_searcher
+from embedding_engine import EmbeddingEngine
+from evaluation import Evaluator, summarize
+from ingestion import sync_vector_store
+from qa_pipeline import QAPipeline
+
+BENCHMARK_PROMPT = """
+Context: {context}
+Chat History: {chat_history}
+Question: {question}
+Answer:"""
+
+STAGES = ("embed", "retrieve", "rerank", "pack", "generate", "total")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddings:
+    """
+    Model-free embeddings (hashed bag of words) for benchmarking the
+    pipeline machinery without any model weights. Also serves as the
+    EmbeddingEngine model through `encode`.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+        self.client = self
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            vector[int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, normalize_embeddings=False):
+        return np.vstack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
+
+
+class StubLLM:
+    """
+    Local stand-in for the Groq client. Answers extractively with the
+    context sentence that shares the most words with the question, so token
+    F1 still moves with retrieval and packing quality. Streams word by word.
+    """
+
+    def _answer(self, prompt_text):
+        context, _, rest = prompt_text.partition("Chat History:")
+        context = context.split("Context:", 1)[-1]
+        question = rest.rsplit("Question:", 1)[-1].split("Answer:", 1)[0]
+        question_words = set(_WORD_RE.findall(question.lower()))
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", context) if s.strip()]
+        if not sentences:
+            return "I don't know."
+        return max(sentences, key=lambda s: len(question_words & set(_WORD_RE.findall(s.lower()))))
+
+    async def ainvoke(self, prompt_text):
+        return SimpleNamespace(content=self._answer(prompt_text))
+
+    async def astream(self, prompt_text):
+        for word in re.findall(r"\S+\s*", self._answer(prompt_text)):
+            yield SimpleNamespace(content=word)
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def retrieval_metrics(docs, sources, k):
+    """(recall@k, reciprocal rank) of the gold `sources` among retrieved chunks"""
+    retrieved = [doc.metadata.get("source") for doc in docs[:k]]
+    found = set(retrieved) & set(sources)
+    first = next((rank for rank, source in enumerate(retrieved, start=1) if source in sources), None)
+    return len(found) / len(set(sources)), 1.0 / first if first else 0.0
+
+
+def percentiles(seconds):
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(values):
+        return {}
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def run_question(pipeline, prompt, question, timings):
+    """Answer one standalone question stage by stage, recording each stage's latency"""
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        value = fn(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return value
+
+    start = time.perf_counter()
+    vector = timed("embed", pipeline.embed_query, question)
+    docs = timed("retrieve", pipeline.searcher.search, question, vector, pipeline.fetch_k)
+    docs = timed("rerank", pipeline.rerank, question, docs)
+    prompt_text, packing = timed("pack", pipeline.packer.pack, prompt, docs, "", question)
+    answer, _ = timed("generate", asyncio.run, pipeline.astream_completion(prompt_text))
+    timings["total"].append(time.perf_counter() - start)
+    return answer, docs, packing
+
+
+def run_benchmark(corpus, questions, k=RETRIEVER_K, embeddings=None, chunker=None,
+                  retrieval_mode=RETRIEVAL_MODE, index_mode=VECTOR_INDEX_MODE, reranker=None):
+    """
+    Ingest `corpus` into a scratch store, answer `questions` and return the
+    result dict. Without `embeddings`/`chunker` the configured model and a
+    default Chunker are used.
+    """
+    from langchain_community.vectorstores import Chroma
+
+    if embeddings is None:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL, encode_kwargs={"normalize_embeddings": True})
+    owns_chunker = chunker is None
+    if owns_chunker:
+        chunker = Chunker()
+
+    db_dir = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        ingest = sync_vector_store(
+            corpus, db_dir, embeddings, chunker=chunker,
+            engine=EmbeddingEngine.from_embeddings(embeddings),
+            on_error=lambda source, e: print(f"skipping {source}: {e}", file=sys.stderr)
+        )
+        vectordb = Chroma(persist_directory=db_dir, embedding_function=embeddings)
+        # Queries are embedded directly; caches would hide repeat-question latency
+        pipeline = QAPipeline(
+            llm=StubLLM(), embeddings=embeddings, index_version=ingest["index_version"], k=k,
+            searcher=build_searcher(vectordb, db_dir, ingest["index_version"], retrieval_mode, index_mode),
+            reranker=reranker
+        )
+        pipeline.embed_query = embeddings.embed_query
+        prompt = PromptTemplate(input_variables=["context", "chat_history", "question"], template=BENCHMARK_PROMPT)
+
+        timings = defaultdict(list)
+        rows = []
+        for item in questions:
+            answer, docs, packing = run_question(pipeline, prompt, item["question"], timings)
+            row = {
+                "question": item["question"], "answer": answer,
+                "chunk_ids": [doc.metadata.get("chunk_id") for doc in docs],
+                "prompt_tokens": packing["prompt_tokens"],
+            }
+            if item.get("sources"):
+                row["recall@k"], row["rr"] = retrieval_metrics(docs, item["sources"], k)
+            rows.append(row)
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+        if owns_chunker:
+            chunker.close()
+
+    # Answer metrics are scored in one batch once every question has run
+    scores = Evaluator().evaluate_many((item["answer"], row["answer"]) for item, row in zip(questions, rows))
+    for row, score in zip(rows, scores):
+        row.update(score)
+    quality = summarize(scores)
+    del quality["similarity"]
+
+    judged = [row for row in rows if "rr" in row]
+    quality[f"recall@{k}"] = float(np.mean([row["recall@k"] for row in judged])) if judged else None
+    quality["mrr"] = float(np.mean([row["rr"] for row in judged])) if judged else None
+    return {
+        "config": {
+            "embed_model": embeddings.model_name, "chunker": chunker.version, "k": k,
+            "retrieval_mode": retrieval_mode, "index_mode": index_mode,
+            "rerank": reranker.model_name if reranker is not None else None,
+            "questions": len(rows),
+        },
+        "ingest": {key: ingest[key] for key in ("num_documents", "chunks", "chunks_per_sec", "timings")},
+        "quality": quality,
+        "latency": {stage: percentiles(timings[stage]) for stage in STAGES},
+        "per_question": rows,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Quality metrics that dropped by more than `tolerance` against `baseline`"""
+    regressions = []
+    for metric, value in result["quality"].items():
+        previous = baseline.get("quality", {}).get(metric)
+        if value is not None and previous is not None and value < previous - tolerance:
+            regressions.append(f"{metric}: {previous:.3f} -> {value:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval/answer benchmark")
+    parser.add_argument("--corpus", required=True, help="ZIP archive of .txt articles")
+    parser.add_argument("--questions", required=True, help="JSONL file of question/answer[/sources]")
+    parser.add_argument("--output", default="benchmark_result.json")
+    parser.add_argument("--k", type=int, default=RETRIEVER_K)
+    parser.add_argument("--retrieval-mode", default=RETRIEVAL_MODE, choices=["dense", "hybrid"])
+    parser.add_argument("--index-mode", default=VECTOR_INDEX_MODE, choices=["chroma", "exact", "hnsw", "ivfpq"])
+    parser.add_argument("--rerank", action="store_true", help="Re-rank with the (locally cached) cross-encoder")
+    parser.add_argument("--hashing-embeddings", action="store_true",
+                        help="Use model-free hashed embeddings instead of the configured model")
+    parser.add_argument("--baseline", help="Earlier result file; exit 1 if quality dropped")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # Default: the configured embedding model and chunker
+    embeddings = chunker = None
+    if args.hashing_embeddings:
+        embeddings = HashingEmbeddings()
+        # No embedding tokenizer to size chunks against
+        chunker = Chunker(max_tokens=0)
+    reranker = None
+    if args.rerank:
+        from reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker()
+
+    result = run_benchmark(
+        args.corpus, load_questions(args.questions), k=args.k, embeddings=embeddings, chunker=chunker,
+        retrieval_mode=args.retrieval_mode, index_mode=args.index_mode, reranker=reranker
+    )
+    if chunker is not None:
+        chunker.close()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    ingest, quality = result["ingest"], result["quality"]
+    print(f"ingest: {ingest['chunks']} chunks from {ingest['num_documents']} documents, "
+          f"{ingest['chunks_per_sec']:.1f} chunks/s")
+    print("quality: " + ", ".join(f"{name}={value:.3f}" for name, value in quality.items() if value is not None))
+    print(f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in result["latency"].items():
+        if row:
+            print(f"{stage:<10}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+    print(f"wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# chat_history.py
+
+
+class ChatMessage:
+    """
+    One displayed chat message. `html` caches the rendered bubble (see
+    ui_components.chat_message_html) so past turns are formatted once.
+    """
+
+    __slots__ = ("role", "text", "answer_type", "gold_standard", "generation", "metrics", "trace", "html")
+
+    def __init__(self, role, text, answer_type=None, gold_standard=None, generation=None, metrics=None, trace=None):
+        self.role = role
+        self.text = text
+        self.answer_type = answer_type
+        self.gold_standard = gold_standard
+        self.generation = generation
+        self.metrics = metrics
+        self.trace = trace
+        self.html = None
+
+    @classmethod
+    def user(cls, text):
+        return cls("user", text)
+
+    @classmethod
+    def ai(cls, text, answer_type, gold_standard=None, generation=None, metrics=None, trace=None):
+        return cls("ai", text, answer_type, gold_standard or None, generation, metrics, trace)
+
+    @classmethod
+    def from_tuple(cls, item):
+        """Convert a ("user"|"ai", text, answer_type, gold, generation, metrics, trace) history tuple"""
+        role, text, *rest = item
+        if role == "user":
+            return cls.user(text)
+        fields = rest + [None] * (5 - len(rest))
+        return cls.ai(text, fields[0] or "Basic Answer", *fields[1:5])
+
+
+def visible_window(messages, window):
+    """(number of hidden older messages, the most recent `window` messages)"""
+    hidden = max(0, len(messages) - window)
+    return hidden, messages[hidden:]
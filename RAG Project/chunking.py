@@ -0,0 +1,233 @@
+# chunking.py
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from config import EMBED_MODEL, CHUNK_SENTENCES, CHUNK_OVERLAP, CHUNK_MAX_TOKENS, CHUNK_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the same settings produce different chunks (recorded in Chunker.version)
+CHUNKER_REVISION = 3
+
+
+class ChunkRecord:
+    """
+    One chunk of a source document. `metadata` is the document's dict,
+    shared by all its chunks rather than copied; `start`/`end` are character
+    offsets of the chunk in the original text, for citations.
+    """
+
+    __slots__ = ("doc_id", "index", "text", "start", "end", "metadata")
+
+    def __init__(self, doc_id, index, text, start, end, metadata):
+        self.doc_id = doc_id
+        self.index = index
+        self.text = text
+        self.start = start
+        self.end = end
+        self.metadata = metadata
+
+    @property
+    def chunk_id(self):
+        return f"{self.doc_id}#{self.index}"
+
+    def vector_metadata(self):
+        """Flat metadata stored with the chunk in the vector store"""
+        return {**self.metadata, "chunk_id": self.chunk_id, "start": self.start, "end": self.end}
+
+
+def sentence_spans(text):
+    """(start, end) character offsets of each sentence found by nltk"""
+    import nltk
+
+    spans = []
+    cursor = 0
+    for sentence in nltk.sent_tokenize(text):
+        start = text.find(sentence, cursor)
+        if start < 0:
+            # sent_tokenize normalised something; fall back to the cursor
+            start = cursor
+        end = start + len(sentence)
+        spans.append((start, end))
+        cursor = end
+    return spans
+
+
+class Chunker:
+    """
+    Sentence-window chunker.
+
+    Sentence segmentation runs across a process pool when `workers` > 1.
+    Windows take up to `sentences_per_chunk` sentences, share `overlap`
+    sentences with the next window and stop early once adding a sentence
+    would exceed `max_tokens` of the embedding model's tokenizer, counting
+    the special tokens the model adds. A single sentence over that budget
+    is split at token boundaries, so chunks are never silently truncated
+    by the embedder.
+    """
+
+    def __init__(self, sentences_per_chunk=CHUNK_SENTENCES, overlap=CHUNK_OVERLAP,
+                 max_tokens=CHUNK_MAX_TOKENS, workers=CHUNK_WORKERS, tokenizer_name=EMBED_MODEL):
+        if not 0 <= overlap < sentences_per_chunk:
+            raise ValueError("overlap must be smaller than sentences_per_chunk")
+        self.sentences_per_chunk = sentences_per_chunk
+        self.overlap = overlap
+        self.max_tokens = max_tokens
+        self.workers = workers
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._pool = None
+
+    @property
+    def version(self):
+        """Identifies the chunk output; recorded in the ingestion manifest"""
+        return (f"r{CHUNKER_REVISION}-sent{self.sentences_per_chunk}-ov{self.overlap}"
+                f"-max{self.max_tokens}-{self.tokenizer_name}")
+
+    def _get_tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+        return self._tokenizer
+
+    def _segment(self, texts):
+        if self.workers and self.workers > 1 and len(texts) > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            chunksize = max(1, len(texts) // (self.workers * 4))
+            return list(self._pool.map(sentence_spans, texts, chunksize=chunksize))
+        return [sentence_spans(text) for text in texts]
+
+    @property
+    def token_budget(self):
+        """Tokens available to chunk text once the model's [CLS]/[SEP]-style tokens are added"""
+        if not self.max_tokens:
+            return 0
+        return self.max_tokens - self._get_tokenizer().num_special_tokens_to_add(pair=False)
+
+    def _tokenize(self, sentences):
+        """Token count and token character offsets (relative to the sentence) of each sentence"""
+        if not self.max_tokens or not sentences:
+            return [0] * len(sentences), [None] * len(sentences)
+        encoded = self._get_tokenizer()(sentences, add_special_tokens=False, return_offsets_mapping=True)
+        return [len(ids) for ids in encoded["input_ids"]], encoded["offset_mapping"]
+
+    @staticmethod
+    def _split_long(spans, counts, offsets, budget):
+        """
+        Spans and token counts with every sentence over `budget` cut into
+        pieces of at most `budget` tokens, each cut moved back to the
+        nearest token that starts a word (one that follows whitespace).
+        """
+        if not budget:
+            return spans, counts
+        pieces, piece_counts = [], []
+        for (start, end), count, token_offsets in zip(spans, counts, offsets):
+            if count <= budget:
+                pieces.append((start, end))
+                piece_counts.append(count)
+                continue
+
+            def starts_word(j):
+                return token_offsets[j][0] > token_offsets[j - 1][1]
+
+            i = 0
+            while i < count:
+                cut = min(i + budget, count)
+                if cut < count:
+                    boundary = cut
+                    while boundary > i + 1 and not starts_word(boundary):
+                        boundary -= 1
+                    # A single "word" longer than the budget is cut mid-word
+                    if starts_word(boundary):
+                        cut = boundary
+                pieces.append((start + token_offsets[i][0], start + token_offsets[cut - 1][1]))
+                piece_counts.append(cut - i)
+                i = cut
+        return pieces, piece_counts
+
+    def _windows(self, token_counts, budget=0):
+        """(first, last) sentence index pairs, last exclusive"""
+        windows = []
+        first = 0
+        while first < len(token_counts):
+            last = first + 1
+            tokens = token_counts[first]
+            limit = min(first + self.sentences_per_chunk, len(token_counts))
+            while last < limit and (not budget or tokens + token_counts[last] <= budget):
+                tokens += token_counts[last]
+                last += 1
+            windows.append((first, last))
+            if last >= len(token_counts):
+                break
+            # The next window repeats the last `overlap` sentences but always advances
+            first = max(first + 1, last - self.overlap)
+        return windows
+
+    def chunk_many(self, documents):
+        """
+        Chunk (doc_id, text, metadata) triples; returns one list of
+        ChunkRecords per document, in input order.
+        """
+        documents = list(documents)
+        all_spans = self._segment([text for _, text, _ in documents])
+
+        # Tokenize every sentence of the batch in one call
+        sentences = [text[start:end] for (_, text, _), spans in zip(documents, all_spans) for start, end in spans]
+        counts, offsets = self._tokenize(sentences)
+        budget = self.token_budget
+        position = 0
+
+        planned = []
+        for (doc_id, text, metadata), spans in zip(documents, all_spans):
+            end = position + len(spans)
+            spans, token_counts = self._split_long(spans, counts[position:end], offsets[position:end], budget)
+            position = end
+            windows = [
+                (first, last, " ".join(text[start:end] for start, end in spans[first:last]))
+                for first, last in self._windows(token_counts, budget)
+            ]
+            planned.append((doc_id, text, spans, windows, metadata))
+        if budget:
+            planned = self._fit_budget(planned, budget)
+
+        results = []
+        for doc_id, _, spans, windows, metadata in planned:
+            results.append([
+                ChunkRecord(doc_id, index, chunk_text, spans[first][0], spans[last - 1][1], metadata)
+                for index, (first, last, chunk_text) in enumerate(windows)
+            ])
+        return results
+
+    def _fit_budget(self, planned, budget):
+        """
+        Count tokens on the final chunk texts (joining pieces can tokenize
+        differently than the pieces did) and break any window over `budget`
+        into one chunk per piece.
+        """
+        texts = [chunk_text for _, _, _, windows, _ in planned for _, _, chunk_text in windows]
+        counts = iter(self._tokenize(texts)[0])
+        fitted = []
+        for doc_id, text, spans, windows, metadata in planned:
+            kept = []
+            for first, last, chunk_text in windows:
+                tokens = next(counts)
+                if tokens <= budget:
+                    kept.append((first, last, chunk_text))
+                elif last - first > 1:
+                    kept.extend((i, i + 1, text[spans[i][0]:spans[i][1]]) for i in range(first, last))
+                else:
+                    logger.warning("Chunk %d of %s has %d tokens (budget %d) and will be truncated by the embedder",
+                                   len(kept), doc_id, tokens, budget)
+                    kept.append((first, last, chunk_text))
+            fitted.append((doc_id, text, spans, kept, metadata))
+        return fitted
+
+    def chunk(self, doc_id, text, metadata=None):
+        return self.chunk_many([(doc_id, text, metadata or {})])[0]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
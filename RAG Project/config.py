@@ -0,0 +1,113 @@
+# config.py
+
+# Paths and model settings shared by the app and the ingestion pipeline
+VECTOR_DB_DIR = "vector_store"
+EMBED_MODEL = "BAAI/bge-base-en-v1.5"
+ZIP_PATH = r"D:\\data.zip"
+LLM_MODEL = "llama3-70b-8192"
+RETRIEVER_K = 3
+
+# Ingestion embedding engine: texts per model batch, CPU worker processes
+# (0 or 1 encodes in-process) and torch threads per encoder
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = 0
+EMBED_TORCH_THREADS = None
+
+# Persistent embedding cache shared by ingestion and queries
+EMBED_CACHE_DIR = "embedding_cache"
+EMBED_CACHE_CAPACITY = 100_000
+
+# Query embedding / retrieval / answer caches
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 3600
+
+# Opt-in near-duplicate answer cache: minimum cosine similarity between
+# question embeddings for a cached answer to be reused
+SEMANTIC_CACHE_ENABLED = False
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_SIZE = 2048
+
+# Upper bound on concurrent Groq calls across all sessions
+GROQ_MAX_CONCURRENCY = 4
+
+# Retrieval: "dense" (Chroma only) or "hybrid" (BM25 + Chroma fused with
+# reciprocal-rank fusion). HYBRID_FETCH_K candidates are taken from each side.
+RETRIEVAL_MODE = "hybrid"
+HYBRID_FETCH_K = 20
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Dense vector index behind the retriever: "chroma" (the collection's own
+# index), "exact" (brute force over a memory-mapped matrix), "hnsw" or
+# "ivfpq". Non-chroma indexes are built under <index version dir>/ann/<mode>.
+# PQ_NBITS is lowered to what a small collection can train (2**nbits
+# vectors); below 16 vectors "ivfpq" searches exactly.
+# Compare recall@k and latency with: python vector_index.py
+VECTOR_INDEX_MODE = "chroma"
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF = 64
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+PQ_M = 48
+PQ_NBITS = 8
+
+# Optional cross-encoder re-ranking: fetch RERANK_FETCH_K candidates, keep
+# the best RETRIEVER_K that fit in RERANK_TOKEN_BUDGET (estimated tokens)
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_FETCH_K = 20
+RERANK_TOKEN_BUDGET = 1500
+RERANK_MIN_SCORE = None
+
+# Prompt packing: budget for the whole answer prompt and for the chat
+# history inside it, in estimated tokens (~4 characters each). Once the
+# unsummarised history exceeds its budget, the oldest turns are folded into
+# a rolling summary by REWRITE_MODEL after the answer; the last
+# HISTORY_RECENT_TURNS turns always stay verbatim
+PROMPT_TOKEN_BUDGET = 3000
+HISTORY_TOKEN_BUDGET = 600
+HISTORY_RECENT_TURNS = 3
+CONTEXT_DEDUPE_THRESHOLD = 0.8
+
+# Chunking: sentences per chunk, sentences shared between consecutive
+# chunks, cap in embedding-model tokens (0 = no cap) and sentence
+# segmentation worker processes (0 or 1 = in-process)
+CHUNK_SENTENCES = 3
+CHUNK_OVERLAP = 0
+CHUNK_MAX_TOKENS = 512
+CHUNK_WORKERS = 0
+
+# Follow-up rewriting: faster model used to rewrite follow-ups into
+# standalone questions (None = LLM_MODEL); follow-ups naming fewer than
+# REWRITE_MIN_WORDS topic words are always rewritten
+REWRITE_MODEL = "llama3-8b-8192"
+REWRITE_MIN_WORDS = 2
+REWRITE_CACHE_SIZE = 1024
+
+# Named corpora: one ZIP archive each, indexed under VECTOR_DB_DIR/<name>.
+# Collections open on first query; at most CORPUS_MAX_OPEN stay open within
+# an estimated CORPUS_MEMORY_LIMIT_MB (least recently used closed first),
+# and questions over several corpora search them on CORPUS_FANOUT_WORKERS
+# threads in parallel
+CORPORA = {"medical": ZIP_PATH}
+CORPUS_MAX_OPEN = 4
+CORPUS_MEMORY_LIMIT_MB = 2048
+CORPUS_FANOUT_WORKERS = 4
+
+# Chat rendering: messages shown initially (and added per "show earlier" click)
+CHAT_RENDER_WINDOW = 20
+
+# Telemetry: port of the /metrics (Prometheus text) and /traces (JSON)
+# endpoint (None = disabled), whether every trace is also logged as a JSON
+# line, level of the app's own log lines (traces, prompt sizes, ingestion
+# reports) and whether answers and the sidebar show stage timings
+METRICS_PORT = None
+TRACE_LOG = True
+LOG_LEVEL = "INFO"
+SHOW_STAGE_TIMINGS = True
+
+# Cold start: NLTK data and model weights fetched at build time by
+# `python prefetch.py`; the app reads them from here without network checks
+MODEL_CACHE_DIR = "model_cache"
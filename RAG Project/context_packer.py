@@ -0,0 +1,144 @@
+# context_packer.py
+
+import re
+
+from config import PROMPT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET, HISTORY_RECENT_TURNS, CONTEXT_DEDUPE_THRESHOLD
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def count_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+class RollingSummary:
+    """
+    Per-session summary of the oldest turns: `covered` messages of the
+    chat memory are folded into `text`. `folding` is set while a summary
+    update runs; `resets` counts clears, so an update that finishes after
+    one is discarded.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.covered = 0
+        self.folding = False
+        self.resets = 0
+
+    def clear(self):
+        self.text = ""
+        self.covered = 0
+        self.resets += 1
+
+
+class ContextPacker:
+    """
+    Keeps every prompt under a token budget.
+
+    Retrieved chunks are deduplicated (same chunk id, or word 3-gram overlap
+    above `dedupe_threshold`). Chat history is reduced to the rolling
+    summary plus the most recent turns that fit `history_budget`. Context
+    chunks then fill whatever is left of `token_budget` in rank order; the
+    last one that does not fit is truncated rather than overflowing, and an
+    over-long question is cut to what the template leaves.
+
+    Budgets are in estimated tokens (count_tokens, ~4 characters each), not
+    model tokens, so leave headroom below the model's context window.
+    """
+
+    def __init__(self, token_budget=PROMPT_TOKEN_BUDGET, history_budget=HISTORY_TOKEN_BUDGET,
+                 recent_turns=HISTORY_RECENT_TURNS, dedupe_threshold=CONTEXT_DEDUPE_THRESHOLD):
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.recent_turns = recent_turns
+        self.dedupe_threshold = dedupe_threshold
+
+    def dedupe(self, docs):
+        """Drop chunks that repeat (or nearly repeat) a higher-ranked chunk"""
+        kept, kept_shingles, seen_ids = [], [], set()
+        for doc in docs:
+            chunk_id = doc.metadata.get("chunk_id")
+            if chunk_id is not None:
+                chunk_id = (doc.metadata.get("corpus"), chunk_id)
+            if chunk_id is not None and chunk_id in seen_ids:
+                continue
+            shingles = _shingles(doc.page_content)
+            if any(
+                len(shingles & other) / min(len(shingles), len(other)) >= self.dedupe_threshold
+                for other in kept_shingles
+            ):
+                continue
+            seen_ids.add(chunk_id)
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept
+
+    def fold_count(self, lines, summary_text=""):
+        """
+        How many of the oldest `lines` (one per message not yet summarised)
+        to fold into the summary: none while they fit `history_budget`,
+        otherwise whole turns from the oldest until the rest fits. The last
+        `recent_turns` turns are never folded.
+        """
+        budget = self.history_budget - count_tokens(summary_text)
+        tokens = sum(count_tokens(line) for line in lines)
+        foldable = len(lines) - 2 * self.recent_turns
+        count = 0
+        while tokens > budget and count + 2 <= foldable:
+            tokens -= count_tokens(lines[count]) + count_tokens(lines[count + 1])
+            count += 2
+        return count
+
+    def format_history(self, summary_text, recent_lines):
+        """Summary plus as many of the most recent lines as fit `history_budget`"""
+        budget = self.history_budget - count_tokens(summary_text)
+        kept = []
+        for line in reversed(recent_lines):
+            tokens = count_tokens(line)
+            if tokens > budget:
+                break
+            kept.append(line)
+            budget -= tokens
+        parts = [f"Summary of earlier conversation: {summary_text}"] if summary_text else []
+        parts.extend(reversed(kept))
+        return "\n" + "\n".join(parts) if parts else ""
+
+    def pack(self, prompt, docs, chat_history, question):
+        """Render `prompt` within the token budget; returns (text, token breakdown)"""
+        docs = self.dedupe(docs)
+        template_tokens = count_tokens(prompt.format(context="", chat_history="", question=""))
+        question_budget = max(0, self.token_budget - template_tokens)
+        if count_tokens(question) > question_budget:
+            question = question[:question_budget * 4]
+        fixed = template_tokens + count_tokens(question)
+        history_tokens = count_tokens(chat_history)
+        if fixed + history_tokens > self.token_budget:
+            chat_history, history_tokens = "", 0
+
+        remaining = self.token_budget - fixed - history_tokens
+        context_parts = []
+        for doc in docs:
+            tokens = count_tokens(doc.page_content) + 1
+            if tokens > remaining:
+                if remaining > 16:
+                    context_parts.append(doc.page_content[:remaining * 4])
+                    remaining = 0
+                break
+            context_parts.append(doc.page_content)
+            remaining -= tokens
+        context = "\n\n".join(context_parts)
+
+        text = prompt.format(context=context, chat_history=chat_history, question=question)
+        info = {
+            "prompt_tokens": count_tokens(text),
+            "context_tokens": count_tokens(context),
+            "history_tokens": history_tokens,
+            "chunks": len(context_parts),
+        }
+        return text, info
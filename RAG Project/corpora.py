@@ -0,0 +1,252 @@
+# corpora.py
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    CORPORA, VECTOR_DB_DIR, RETRIEVAL_MODE, VECTOR_INDEX_MODE,
+    CORPUS_MAX_OPEN, CORPUS_MEMORY_LIMIT_MB, CORPUS_FANOUT_WORKERS
+)
+from hybrid_retriever import HybridSearcher, load_or_build_bm25, reciprocal_rank_fusion
+from ingestion import active_store_dir, load_manifest
+from qa_pipeline import DenseSearcher
+from vector_index import IndexedSearcher, load_or_build_index
+
+logger = logging.getLogger(__name__)
+
+# Used for the memory estimate when a manifest predates the recorded dimension
+_DEFAULT_DIM = 768
+
+
+def release_store(vectordb):
+    """
+    Stop the chromadb System behind a LangChain Chroma store. chromadb
+    caches one System per persist path for the whole process, so dropping
+    the Chroma object alone keeps its segments and HNSW index in memory.
+    """
+    client = getattr(vectordb, "_client", None)
+    system = getattr(client, "_system", None)
+    if system is None:
+        return
+    try:
+        # Class-level cache of SharedSystemClient (private chromadb API)
+        getattr(client, "_identifer_to_system", {}).pop(getattr(client, "_identifier", None), None)
+        system.stop()
+    except Exception:
+        logger.warning("Could not release the Chroma store", exc_info=True)
+
+
+def build_searcher(vectordb, db_dir, index_version, retrieval_mode=RETRIEVAL_MODE, index_mode=VECTOR_INDEX_MODE):
+    """Dense or hybrid searcher over one Chroma collection"""
+    if index_mode == "chroma":
+        dense = DenseSearcher(vectordb)
+    else:
+        index, ids = load_or_build_index(vectordb, db_dir, index_version, index_mode)
+        dense = IndexedSearcher(vectordb, index, ids)
+    if retrieval_mode == "hybrid":
+        return HybridSearcher(vectordb, dense, load_or_build_bm25(vectordb, db_dir, index_version))
+    return dense
+
+
+class Corpus:
+    """One open collection: its live index version, Chroma client and searcher"""
+
+    def __init__(self, name, store_dir, manifest, vectordb, searcher):
+        self.name = name
+        self.store_dir = store_dir
+        self.index_version = manifest.get("index_version") or "none"
+        self.num_documents = len(manifest.get("files") or {})
+        self.num_chunks = sum(entry["chunks"] for entry in (manifest.get("files") or {}).values())
+        self.vectordb = vectordb
+        self.searcher = searcher
+        self.estimated_bytes = self._estimate_bytes(manifest.get("dim") or _DEFAULT_DIM)
+        # Searches in flight and whether the registry let go of the corpus
+        # (both guarded by the registry lock): the store is released once
+        # a closed corpus has no searches left
+        self.users = 0
+        self.closed = False
+
+    def _estimate_bytes(self, dim):
+        # Rough resident size: float32 vectors plus about as much again for
+        # the HNSW graph, and the BM25 postings when hybrid search is on
+        size = self.num_chunks * dim * 4 * 2
+        bm25 = getattr(self.searcher, "bm25", None)
+        if bm25 is not None:
+            size += bm25.offsets.nbytes + bm25.rows.nbytes + bm25.weights.nbytes
+        return size
+
+    def search(self, question, vector, k):
+        docs = self.searcher.search(question, vector, k)
+        for doc in docs:
+            doc.metadata["corpus"] = self.name
+        return docs
+
+    def release(self):
+        release_store(self.vectordb)
+
+
+class CorpusRegistry:
+    """
+    Named corpora, one versioned store per archive under `root`/<name>.
+
+    Collections are opened on first use and kept in an LRU: once more than
+    `max_open` are open, or their estimated memory exceeds
+    `memory_limit_mb`, the least recently used ones are closed and their
+    Chroma stores released once no search is using them. A search over
+    several corpora queries them in parallel and merges the rankings with
+    reciprocal-rank fusion.
+    """
+
+    def __init__(self, embeddings_factory, corpora=None, root=VECTOR_DB_DIR, max_open=CORPUS_MAX_OPEN,
+                 memory_limit_mb=CORPUS_MEMORY_LIMIT_MB, workers=CORPUS_FANOUT_WORKERS):
+        self.embeddings_factory = embeddings_factory
+        self.zip_paths = dict(corpora if corpora is not None else CORPORA)
+        self.root = root
+        self.max_open = max_open
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self._open = OrderedDict()
+        self._info = {}
+        self._lock = threading.Lock()
+        self._open_locks = {name: threading.Lock() for name in self.zip_paths}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="corpus-search")
+
+    @property
+    def names(self):
+        return list(self.zip_paths)
+
+    def store_root(self, name):
+        return os.path.join(self.root, name)
+
+    def info(self, name):
+        """Index version and size of a corpus from its manifest, without opening it"""
+        info = self._info.get(name)
+        if info is None:
+            store_dir = active_store_dir(self.store_root(name))
+            manifest = load_manifest(store_dir) or {}
+            info = {
+                "store_dir": store_dir,
+                "index_version": manifest.get("index_version") or "none",
+                "num_documents": len(manifest.get("files") or {}),
+            }
+            self._info[name] = info
+        return info
+
+    def index_version(self, names):
+        """Combined version id of a corpus selection, for cache keys"""
+        return "+".join(f"{name}={self.info(name)['index_version']}" for name in names)
+
+    def get(self, name, lease=False):
+        """
+        The open Corpus `name`, opening it (and closing others) if needed.
+        With `lease` the corpus stays usable until passed to `unlease`,
+        even if it is closed meanwhile.
+        """
+        with self._lock:
+            corpus = self._open.get(name)
+            if corpus is not None:
+                self._open.move_to_end(name)
+                if lease:
+                    corpus.users += 1
+                return corpus
+        # Opening can take seconds; other corpora stay usable meanwhile
+        with self._open_locks[name]:
+            with self._lock:
+                corpus = self._open.get(name)
+            if corpus is None:
+                corpus = self._load(name)
+            with self._lock:
+                self._open[name] = corpus
+                self._open.move_to_end(name)
+                if lease:
+                    corpus.users += 1
+                released = self._evict()
+        self._release(released)
+        return corpus
+
+    def unlease(self, corpus):
+        with self._lock:
+            corpus.users -= 1
+            released = [corpus] if corpus.closed and not corpus.users else []
+        self._release(released)
+
+    def _close(self, corpus):
+        # Called with the lock held; returns the corpus if it can be released now
+        corpus.closed = True
+        return [] if corpus.users else [corpus]
+
+    @staticmethod
+    def _release(corpora):
+        for corpus in corpora:
+            corpus.release()
+
+    def _load(self, name):
+        from langchain_community.vectorstores import Chroma
+
+        info = self.info(name)
+        store_dir = info["store_dir"]
+        manifest = load_manifest(store_dir) or {}
+        vectordb = Chroma(persist_directory=store_dir, embedding_function=self.embeddings_factory())
+        return Corpus(name, store_dir, manifest, vectordb, build_searcher(vectordb, store_dir, info["index_version"]))
+
+    def _evict(self):
+        released = []
+        while len(self._open) > 1 and (
+            len(self._open) > self.max_open or self.memory_bytes() > self.memory_limit
+        ):
+            released += self._close(self._open.popitem(last=False)[1])
+        return released
+
+    def memory_bytes(self):
+        return sum(corpus.estimated_bytes for corpus in self._open.values())
+
+    def open_names(self):
+        with self._lock:
+            return list(self._open)
+
+    def invalidate(self, name):
+        """Forget a corpus after its index changed on disk; it is reopened on next use"""
+        with self._lock:
+            corpus = self._open.pop(name, None)
+            self._info.pop(name, None)
+            released = self._close(corpus) if corpus is not None else []
+        self._release(released)
+
+    def _search_one(self, name, question, vector, k):
+        corpus = self.get(name, lease=True)
+        try:
+            return corpus.search(question, vector, k)
+        finally:
+            self.unlease(corpus)
+
+    def search(self, names, question, vector, k):
+        if len(names) == 1:
+            return self._search_one(names[0], question, vector, k)
+        futures = [
+            self._executor.submit(self._search_one, name, question, vector, k)
+            for name in names
+        ]
+        results = [future.result() for future in futures]
+        docs_by_key = {}
+        rankings = []
+        for docs in results:
+            ranking = []
+            for doc in docs:
+                key = (doc.metadata["corpus"], doc.metadata.get("chunk_id"))
+                docs_by_key[key] = doc
+                ranking.append(key)
+            rankings.append(ranking)
+        return [docs_by_key[key] for key in reciprocal_rank_fusion(rankings)[:k]]
+
+
+class CorpusSearcher:
+    """Searcher over a fixed selection of corpora, resolved through the registry on every query"""
+
+    def __init__(self, registry, names):
+        self.registry = registry
+        self.names = list(names)
+
+    def search(self, question, vector, k):
+        return self.registry.search(self.names, question, vector, k)
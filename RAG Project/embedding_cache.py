@@ -0,0 +1,200 @@
+# embedding_cache.py
+
+import atexit
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import EMBED_CACHE_DIR, EMBED_CACHE_CAPACITY
+
+
+def normalize_text(text):
+    """Canonical form of a chunk/query used for cache keys"""
+    return " ".join(text.split())
+
+
+def cache_key(model_name, text):
+    """20-byte key for (model, normalised text)"""
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, normalised text).
+
+    Vectors live in a memory-mapped float32 matrix with one row per entry;
+    a small hash index maps keys to rows and tracks recency. When the cache
+    is full the least recently used rows are overwritten. Nothing is
+    written to disk until `flush()`, which also runs at interpreter exit.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBED_CACHE_DIR, capacity=EMBED_CACHE_CAPACITY, flush_every=256):
+        self.model_name = model_name
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._rows = {}
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self._dirty = 0
+        self._load()
+        atexit.register(self.flush)
+
+    # --- persistence ---
+    def _vectors_path(self):
+        return self.dir / "vectors.f32"
+
+    def _index_path(self):
+        return self.dir / "index.npz"
+
+    def _open_vectors(self, dim, mode):
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+
+    def _load(self):
+        index_path = self._index_path()
+        if not index_path.exists() or not self._vectors_path().exists():
+            return
+        try:
+            index = np.load(index_path)
+            dim = int(index["dim"])
+            if int(index["capacity"]) != self.capacity:
+                # Capacity changed: start over rather than remapping rows
+                return
+            self._open_vectors(dim, "r+")
+            keys, rows = index["keys"], index["rows"]
+            self._rows = {bytes(key): int(row) for key, row in zip(keys, rows)}
+            self._last_used = index["last_used"].astype(np.int64)
+            self._clock = int(self._last_used.max()) if len(self._last_used) else 0
+        except (OSError, ValueError, KeyError):
+            self._vectors = None
+            self._rows = {}
+
+    def flush(self):
+        """Persist the index and sync the vector matrix to disk"""
+        with self._lock:
+            if self._vectors is None or not self._dirty:
+                return
+            self._vectors.flush()
+            keys = np.array(list(self._rows), dtype="S20")
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            tmp_path = self._index_path().with_suffix(".tmp.npz")
+            np.savez(
+                tmp_path, keys=keys, rows=rows, last_used=self._last_used,
+                dim=self._vectors.shape[1], capacity=self.capacity
+            )
+            os.replace(tmp_path, self._index_path())
+            self._dirty = 0
+
+    # --- lookup ---
+    def get_many(self, texts):
+        """Return a list with a cached vector or None for each text"""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        results = []
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._clock += 1
+                self._last_used[row] = self._clock
+                results.append(np.array(self._vectors[row]))
+        return results
+
+    def put_many(self, texts, vectors):
+        """Store vectors for texts, evicting least recently used rows when full"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        # Only the most recent `capacity` entries can be kept
+        texts, vectors = texts[-self.capacity:], vectors[-self.capacity:]
+        keys = [cache_key(self.model_name, text) for text in texts]
+
+        with self._lock:
+            if self._vectors is None:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                self._open_vectors(vectors.shape[1], "w+")
+                self._last_used[:] = 0
+
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self._rows]
+            protected = {self._rows[key] for key in keys if key in self._rows}
+            free_rows = self._free_rows(len(new_keys), protected)
+            for key, row in zip(new_keys, free_rows):
+                self._rows[key] = row
+            for key, vector in zip(keys, vectors):
+                row = self._rows[key]
+                self._vectors[row] = vector
+                self._clock += 1
+                self._last_used[row] = self._clock
+            self._dirty += len(keys)
+            should_flush = self._dirty >= self.flush_every
+
+        if should_flush:
+            self.flush()
+
+    def _free_rows(self, count, protected):
+        used = len(self._rows)
+        rows = list(range(used, min(used + count, self.capacity)))
+        missing = count - len(rows)
+        if missing > 0:
+            # Evict the least recently used entries not touched by this batch;
+            # rows just taken from the free tail are still at last_used 0
+            protected = protected | set(rows)
+            victims = []
+            for row in np.argsort(self._last_used, kind="stable").tolist():
+                if row not in protected:
+                    victims.append(row)
+                    if len(victims) == missing:
+                        break
+            victim_set = set(victims)
+            for key in [key for key, row in self._rows.items() if row in victim_set]:
+                del self._rows[key]
+            rows.extend(victims)
+        return rows
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that consults an EmbeddingCache first"""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    @property
+    def model_name(self):
+        return self.embeddings.model_name
+
+    @property
+    def client(self):
+        return self.embeddings.client
+
+    def embed_documents(self, texts):
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], vectors)
+            for i, vector in zip(missing, vectors):
+                cached[i] = vector
+        return [list(map(float, vector)) for vector in cached]
+
+    def embed_query(self, text):
+        vector = self.cache.get_many([text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([text], [vector])
+        return list(map(float, vector))
@@ -0,0 +1,143 @@
+# embedding_engine.py
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_TORCH_THREADS
+
+# Recorded in the ingestion manifest: vectors are L2-normalised once at
+# ingestion time, so query embeddings must be normalised the same way.
+EMBEDDING_VERSION = "normalized-v1"
+
+# Model instance owned by each pool worker process
+_worker_model = None
+
+
+def _load_model(model_name, torch_threads=None):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def _worker_init(model_name, torch_threads):
+    global _worker_model
+    _worker_model = _load_model(model_name, torch_threads)
+
+
+def _worker_encode(texts, batch_size):
+    return _worker_model.encode(
+        texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=False
+    )
+
+
+def normalize(vectors):
+    """L2-normalise the rows of a float32 matrix in place"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+class EmbeddingEngine:
+    """
+    Batched embedding for ingestion.
+
+    Texts are sorted by length so each model batch pads as little as
+    possible, encoded either in-process (optionally with a fixed number of
+    torch threads) or across a pool of CPU worker processes, and normalised
+    once on the way out. Results come back in the caller's order. With an
+    EmbeddingCache attached, only texts missing from the cache are encoded.
+    """
+
+    def __init__(self, model_name=EMBED_MODEL, batch_size=EMBED_BATCH_SIZE,
+                 workers=EMBED_WORKERS, torch_threads=EMBED_TORCH_THREADS, model=None, cache=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self._model = model
+        self._pool = None
+        self.cache = cache
+        self.stats = {"chunks": 0, "batches": 0, "cache_hits": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_embeddings(cls, embeddings, **kwargs):
+        """Reuse the model (and cache, if any) of a HuggingFaceEmbeddings/CachedEmbeddings"""
+        kwargs.setdefault("cache", getattr(embeddings, "cache", None))
+        return cls(model_name=embeddings.model_name, model=getattr(embeddings, "client", None), **kwargs)
+
+    def _encode_local(self, batches):
+        if self._model is None:
+            self._model = _load_model(self.model_name, self.torch_threads)
+        return [
+            self._model.encode(batch, batch_size=len(batch), convert_to_numpy=True, normalize_embeddings=False)
+            for batch in batches
+        ]
+
+    def _encode_pool(self, batches):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_worker_init,
+                initargs=(self.model_name, self.torch_threads)
+            )
+        return list(self._pool.map(_worker_encode, batches, [len(batch) for batch in batches]))
+
+    def embed(self, texts):
+        """Embed `texts` and return a normalised float32 matrix in input order"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._embed(texts)
+
+        start = time.perf_counter()
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        self.stats["cache_hits"] += len(texts) - len(missing)
+        if missing:
+            fresh = self._embed([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+        else:
+            self.stats["seconds"] += time.perf_counter() - start
+        return np.vstack(cached).astype(np.float32, copy=False)
+
+    def _embed(self, texts):
+        start = time.perf_counter()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [
+            [texts[i] for i in order[pos:pos + self.batch_size]]
+            for pos in range(0, len(order), self.batch_size)
+        ]
+        if self.workers and self.workers > 1:
+            encoded = self._encode_pool(batches)
+        else:
+            encoded = self._encode_local(batches)
+
+        sorted_vectors = np.vstack(encoded).astype(np.float32, copy=False)
+        vectors = np.empty_like(sorted_vectors)
+        vectors[order] = sorted_vectors
+        normalize(vectors)
+
+        self.stats["chunks"] += len(texts)
+        self.stats["batches"] += len(batches)
+        self.stats["seconds"] += time.perf_counter() - start
+        return vectors
+
+    def throughput(self):
+        """Chunks embedded per second so far"""
+        seconds = self.stats["seconds"]
+        return self.stats["chunks"] / seconds if seconds else 0.0
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
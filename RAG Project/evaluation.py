@@ -2,16 +2,140 @@
 
 import re
 
+import numpy as np
+
+from query_cache import TTLCache
+
+_TOKEN_RE = re.compile(r"\b\w+\b")
+
+METRICS = ("precision", "recall", "f1", "exact_match", "rouge_l", "similarity")
+
+
 def simple_tokenize(text):
-    return re.findall(r"\b\w+\b", text.lower())
+    return _TOKEN_RE.findall(text.lower())
 
-def evaluate_f1(gold_answer, predicted_answer):
-    gold_tokens = set(simple_tokenize(gold_answer))
-    pred_tokens = set(simple_tokenize(predicted_answer))
 
-    tp = len(gold_tokens & pred_tokens)
-    precision = tp / len(pred_tokens) if pred_tokens else 0
-    recall = tp / len(gold_tokens) if gold_tokens else 0
-    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+def lcs_length(a, b):
+    """
+    Length of the longest common subsequence of token sequences `a` and
+    `b`, bit-parallel over the positions of `a` (one big-int operation per
+    token of `b` instead of a len(a) x len(b) table).
+    """
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    v = full
+    for token in b:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count("1")
+
+
+def _safe_divide(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def _harmonic_mean(precision, recall):
+    return _safe_divide(2 * precision * recall, precision + recall)
+
+
+class Evaluator:
+    """
+    Batch answer evaluation: set-based token precision/recall/F1 (same
+    definition as evaluate_f1), exact match, ROUGE-L and, with `embeddings`
+    attached, cosine similarity of gold and answer embeddings.
+
+    Every distinct text of a batch is tokenized once. Token overlaps of all
+    pairs are computed together with NumPy set operations and embeddings
+    are requested in a single batch. Scores are cached per (gold, answer)
+    pair, so re-evaluating the same answer costs a dict lookup.
+    """
+
+    def __init__(self, embeddings=None, cache_size=50_000):
+        self.embeddings = embeddings
+        self.cache = TTLCache(maxsize=cache_size, ttl=None)
 
-    return round(precision, 2), round(recall, 2), round(f1, 2)
+    def evaluate(self, gold_answer, predicted_answer):
+        return self.evaluate_many([(gold_answer, predicted_answer)])[0]
+
+    def evaluate_many(self, pairs):
+        """Metric dicts for (gold, predicted) pairs, in input order"""
+        pairs = list(pairs)
+        results = [self.cache.get(pair) for pair in pairs]
+        missing = list(dict.fromkeys(pair for pair, result in zip(pairs, results) if result is None))
+        if missing:
+            fresh = dict(zip(missing, self._score(missing)))
+            for pair, result in fresh.items():
+                self.cache.set(pair, result)
+            results = [result if result is not None else fresh[pair] for pair, result in zip(pairs, results)]
+        return results
+
+    def _score(self, pairs):
+        texts = list(dict.fromkeys(text for pair in pairs for text in pair))
+        vocab = {}
+        tokens = {}
+        for text in texts:
+            tokens[text] = [vocab.setdefault(token, len(vocab)) for token in simple_tokenize(text)]
+        gold = [tokens[g] for g, _ in pairs]
+        pred = [tokens[p] for _, p in pairs]
+
+        # One (pair, token) key per distinct token of each text; shared keys are the overlap
+        def keys(id_lists):
+            lengths = [len(ids) for ids in id_lists]
+            rows = np.repeat(np.arange(len(id_lists), dtype=np.int64), lengths)
+            ids = np.fromiter((i for ids in id_lists for i in ids), dtype=np.int64, count=sum(lengths))
+            return np.unique(rows * max(len(vocab), 1) + ids)
+
+        gold_keys, pred_keys = keys(gold), keys(pred)
+        width = max(len(vocab), 1)
+        n = len(pairs)
+        gold_sizes = np.bincount(gold_keys // width, minlength=n)
+        pred_sizes = np.bincount(pred_keys // width, minlength=n)
+        overlap = np.bincount(np.intersect1d(gold_keys, pred_keys, assume_unique=True) // width, minlength=n)
+        precision = _safe_divide(overlap, pred_sizes)
+        recall = _safe_divide(overlap, gold_sizes)
+        f1 = _harmonic_mean(precision, recall)
+
+        lcs = np.array([lcs_length(g, p) for g, p in zip(gold, pred)], dtype=np.float64)
+        gold_lengths = np.array([len(g) for g in gold])
+        pred_lengths = np.array([len(p) for p in pred])
+        rouge_l = _harmonic_mean(_safe_divide(lcs, pred_lengths), _safe_divide(lcs, gold_lengths))
+        exact = [bool(g) and g == p for g, p in zip(gold, pred)]
+
+        similarity = [None] * n
+        if self.embeddings is not None:
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms > 0, norms, 1.0)
+            rows = {text: i for i, text in enumerate(texts)}
+            gold_rows = [rows[g] for g, _ in pairs]
+            pred_rows = [rows[p] for _, p in pairs]
+            similarity = np.einsum("ij,ij->i", vectors[gold_rows], vectors[pred_rows]).tolist()
+
+        return [
+            {
+                "precision": float(precision[i]), "recall": float(recall[i]), "f1": float(f1[i]),
+                "exact_match": exact[i], "rouge_l": float(rouge_l[i]), "similarity": similarity[i],
+            }
+            for i in range(n)
+        ]
+
+
+def summarize(results):
+    """Mean of each metric over a list of metric dicts (None where unavailable)"""
+    summary = {}
+    for metric in METRICS:
+        values = [result[metric] for result in results if result[metric] is not None]
+        summary[metric] = float(np.mean(values)) if values else None
+    return summary
+
+
+_default_evaluator = Evaluator()
+
+
+def evaluate_f1(gold_answer, predicted_answer):
+    result = _default_evaluator.evaluate(gold_answer, predicted_answer)
+    return round(result["precision"], 2), round(result["recall"], 2), round(result["f1"], 2)
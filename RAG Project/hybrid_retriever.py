@@ -0,0 +1,181 @@
+# hybrid_retriever.py
+
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from config import BM25_K1, BM25_B, RRF_K, HYBRID_FETCH_K
+
+BM25_FILE = "bm25_index.npz"
+
+# Keeps dosages ("2.5", "500mg") and gene/drug symbols ("il-6", "brca1") whole
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def bm25_tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Compact in-memory BM25 index.
+
+    Postings are stored CSR-style in flat NumPy arrays: for term t the
+    chunk rows are `rows[offsets[t]:offsets[t + 1]]`, and `weights` holds
+    the fully precomputed BM25 contribution (IDF x saturated, length
+    normalised TF) of each posting, so a query is a gather plus one
+    `np.bincount`.
+    """
+
+    def __init__(self, chunk_ids, vocab, offsets, rows, weights, index_version=None):
+        self.chunk_ids = chunk_ids
+        self.vocab = vocab
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.index_version = index_version
+
+    @classmethod
+    def build(cls, chunk_ids, texts, index_version=None, k1=BM25_K1, b=BM25_B):
+        term_ids = {}
+        posting_terms, posting_rows, posting_tfs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(bm25_tokenize(text))
+            doc_lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                posting_rows.append(row)
+                posting_tfs.append(tf)
+
+        terms = np.asarray(posting_terms, dtype=np.int32)
+        rows = np.asarray(posting_rows, dtype=np.int32)
+        tfs = np.asarray(posting_tfs, dtype=np.float32)
+
+        # Group postings by term
+        order = np.argsort(terms, kind="stable")
+        terms, rows, tfs = terms[order], rows[order], tfs[order]
+        doc_freq = np.bincount(terms, minlength=len(term_ids))
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(doc_freq, out=offsets[1:])
+        doc_freq = doc_freq.astype(np.float32)
+
+        num_docs = max(len(texts), 1)
+        idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if len(texts) else 1.0
+        norm = k1 * (1 - b + b * doc_lengths[rows] / (avg_length or 1.0))
+        weights = idf[terms] * tfs * (k1 + 1) / (tfs + norm)
+
+        return cls(list(chunk_ids), term_ids, offsets, rows, weights.astype(np.float32), index_version)
+
+    def search(self, query, k):
+        """Return [(chunk_id, score)] for the top `k` chunks"""
+        term_ids = {self.vocab[term] for term in bm25_tokenize(query) if term in self.vocab}
+        if not term_ids:
+            return []
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        rows = np.concatenate([self.rows[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        if len(rows) * 8 < len(self.chunk_ids):
+            # Rare terms: accumulate over the touched rows only
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        else:
+            scores = np.bincount(rows, weights=weights, minlength=len(self.chunk_ids))
+            candidates = np.arange(len(scores))
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunk_ids[candidates[i]], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path):
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        tmp_path = Path(path).with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            offsets=self.offsets, rows=self.rows, weights=self.weights,
+            meta=np.frombuffer(json.dumps({
+                "terms": terms, "chunk_ids": self.chunk_ids, "index_version": self.index_version
+            }).encode("utf-8"), dtype=np.uint8)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            vocab = {term: term_id for term_id, term in enumerate(meta["terms"])}
+            return cls(meta["chunk_ids"], vocab, data["offsets"], data["rows"], data["weights"], meta["index_version"])
+
+
+def iter_collection(vectordb, page_size=5000, include=("documents",)):
+    """Page through every chunk stored in a Chroma collection"""
+    offset = 0
+    while True:
+        page = vectordb.get(include=list(include), limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def load_or_build_bm25(vectordb, db_dir, index_version):
+    """Load the persisted BM25 index, rebuilding it when the vector index changed"""
+    path = Path(db_dir) / BM25_FILE
+    if path.exists():
+        try:
+            index = BM25Index.load(path)
+            if index.index_version == index_version:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    chunk_ids, texts = [], []
+    for page in iter_collection(vectordb):
+        chunk_ids.extend(page["ids"])
+        texts.extend(page["documents"])
+    index = BM25Index.build(chunk_ids, texts, index_version)
+    index.save(path)
+    return index
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (rrf_k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridSearcher:
+    """Dense search and BM25 fused with reciprocal-rank fusion"""
+
+    def __init__(self, vectordb, dense, bm25, fetch_k=HYBRID_FETCH_K):
+        self.vectordb = vectordb
+        self.dense = dense
+        self.bm25 = bm25
+        self.fetch_k = fetch_k
+
+    def search(self, question, vector, k):
+        fetch_k = max(self.fetch_k, k)
+        dense_docs = self.dense.search(question, vector, fetch_k)
+        docs_by_id = {doc.metadata.get("chunk_id"): doc for doc in dense_docs}
+        dense_ranking = [doc.metadata.get("chunk_id") for doc in dense_docs]
+        sparse_ranking = [chunk_id for chunk_id, _ in self.bm25.search(question, fetch_k)]
+
+        fused = reciprocal_rank_fusion([dense_ranking, sparse_ranking])[:k]
+        missing = [chunk_id for chunk_id in fused if chunk_id not in docs_by_id]
+        if missing:
+            from langchain.schema import Document
+
+            page = self.vectordb.get(ids=missing, include=["documents", "metadatas"])
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                docs_by_id[chunk_id] = Document(page_content=text, metadata=metadata or {})
+        return [docs_by_id[chunk_id] for chunk_id in fused if chunk_id in docs_by_id]
@@ -0,0 +1,117 @@
+# ingest_worker.py
+
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from ingestion import refresh_store
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJob:
+    """State of one queued corpus refresh, updated by the worker thread"""
+
+    def __init__(self, zip_path, root, name=None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.zip_path = zip_path
+        self.root = root
+        self.name = name
+        self.state = "queued"
+        self.done = 0
+        self.total = 0
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.file_errors = []
+        self.finished = threading.Event()
+
+    def _progress(self, done, total):
+        self.done = done
+        self.total = total
+
+    def _file_error(self, source, error):
+        self.file_errors.append((source, str(error)))
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def status(self):
+        """Snapshot for the UI: state, percent complete and ETA in seconds"""
+        percent = self.done / self.total if self.total else 0.0
+        eta = None
+        if self.state == "running" and self.started_at and 0 < percent < 1:
+            elapsed = time.time() - self.started_at
+            eta = elapsed / percent - elapsed
+        return {
+            "job_id": self.job_id, "name": self.name, "state": self.state, "percent": percent, "eta": eta,
+            "done": self.done, "total": self.total, "error": self.error,
+            "file_errors": len(self.file_errors), "report": self.result,
+        }
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class IngestionWorker:
+    """
+    Single background thread that refreshes versioned vector stores from
+    queued archive paths, one job at a time, so no Streamlit session
+    blocks on ingestion. Queries keep using the live version until a build
+    finishes; `on_swap(job)` is then called so shared clients can move to
+    the new version.
+    """
+
+    def __init__(self, root, embedding_factory, on_swap=None):
+        self.root = root
+        self.embedding_factory = embedding_factory
+        self.on_swap = on_swap
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, zip_path, root=None, name=None):
+        """
+        Queue a refresh of the store under `root` (default: the worker's)
+        from `zip_path`, or return the job already queued/running for it.
+        """
+        root = root or self.root
+        with self._lock:
+            job = self._jobs.get(root)
+            if job is None or not job.active:
+                job = IngestJob(zip_path, root, name)
+                self._jobs[root] = job
+                self._queue.put(job)
+            return job
+
+    def jobs(self):
+        """Most recent job per store root"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                job.result = refresh_store(
+                    job.zip_path, job.root, self.embedding_factory(),
+                    on_error=job._file_error, progress=job._progress
+                )
+                if job.result["swapped"] and self.on_swap:
+                    self.on_swap(job)
+                job.state = "done"
+            except Exception as e:
+                logger.exception("Ingestion of %s failed", job.zip_path)
+                job.error = str(e)
+                job.state = "error"
+            finally:
+                job.finished_at = time.time()
+                job.finished.set()
@@ -0,0 +1,381 @@
+# ingestion.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from contextlib import ExitStack, closing, contextmanager
+from itertools import islice
+from pathlib import Path
+
+import telemetry
+from chunking import Chunker
+from embedding_engine import EmbeddingEngine, EMBEDDING_VERSION
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "ingest_manifest.json"
+# Versioned layout: <root>/CURRENT names the live v-<id> directory and
+# <root>/BUILDING the one being built (kept until it is complete)
+CURRENT_FILE = "CURRENT"
+BUILDING_FILE = "BUILDING"
+VERSION_PREFIX = "v-"
+# Chunks handed to the embedding engine / vector store per batch
+INGEST_BATCH_SIZE = 1024
+# Articles segmented together (one process-pool round trip) by the chunker
+CHUNK_GROUP_SIZE = 64
+
+
+def content_sha256(data):
+    """Content hash of one archive member"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_ids(source, num_chunks):
+    """Stable vector store ids for the chunks of one source file"""
+    return [f"{source}#{i}" for i in range(num_chunks)]
+
+
+def load_manifest(db_dir):
+    """Load the ingestion manifest stored next to the vector store"""
+    path = Path(db_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(db_dir, manifest):
+    """Atomically write the ingestion manifest"""
+    path = Path(db_dir) / MANIFEST_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _read_pointer(path):
+    try:
+        return Path(path).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def _write_pointer(path, name):
+    tmp_path = Path(path).with_suffix(".tmp")
+    tmp_path.write_text(name, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def active_store_dir(root):
+    """Directory of the live index version under `root` (`root` itself for an unversioned store)"""
+    name = _read_pointer(Path(root) / CURRENT_FILE)
+    return str(Path(root) / name) if name else str(root)
+
+
+def _is_article(info):
+    return not info.is_dir() and info.filename.endswith(".txt")
+
+
+def _zip_fingerprint(zip_path):
+    stat = os.stat(zip_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _settings(embed_model, chunker):
+    # A different chunker configuration produces different chunks, so
+    # indexes built with another one are rebuilt instead of reused
+    return {
+        "chunker_version": chunker.version,
+        "embed_model": embed_model,
+        "embedding_version": EMBEDDING_VERSION,
+    }
+
+
+@contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] += time.perf_counter() - start
+
+
+def iter_changed_articles(zip_ref, previous, seen, on_error=None, timings=None):
+    """
+    Yield (source, digest, text) for every .txt member whose content hash
+    differs from the manifest. Members are read straight from the archive,
+    one at a time; the hash of every member is recorded in `seen`.
+    """
+    timings = timings if timings is not None else defaultdict(float)
+    for info in zip_ref.infolist():
+        if not _is_article(info):
+            continue
+        source = info.filename
+        try:
+            with _timed(timings, "read"):
+                data = zip_ref.read(info)
+                digest = content_sha256(data)
+                seen[source] = digest
+                if previous.get(source, {}).get("sha256") == digest:
+                    continue
+                text = data.decode("utf-8")
+        except Exception as e:
+            seen.pop(source, None)
+            if on_error:
+                on_error(source, e)
+            continue
+        yield source, digest, text
+
+
+def iter_chunk_batches(articles, counts, chunker, batch_size=INGEST_BATCH_SIZE, timings=None):
+    """
+    Chunk a stream of (source, digest, text) articles and yield lists of at
+    most `batch_size` ChunkRecords. Articles are handed to the chunker in
+    groups so sentence segmentation can run in parallel. The number of
+    chunks produced per source is recorded in `counts`.
+    """
+    timings = timings if timings is not None else defaultdict(float)
+
+    def chunks():
+        while True:
+            group = list(islice(articles, CHUNK_GROUP_SIZE))
+            if not group:
+                return
+            with _timed(timings, "chunk"):
+                records = chunker.chunk_many(
+                    (source, text, {"source": source}) for source, _, text in group
+                )
+            for (source, digest, _), source_chunks in zip(group, records):
+                counts[source] = (digest, len(source_chunks))
+                yield from source_chunks
+
+    stream = chunks()
+    while True:
+        batch = list(islice(stream, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def needs_sync(zip_path, db_dir, embedding, chunker):
+    """True unless the store in `db_dir` was built from this exact archive with these settings"""
+    manifest = load_manifest(db_dir)
+    return (
+        manifest is None
+        or manifest.get("settings") != _settings(getattr(embedding, "model_name", None), chunker)
+        or manifest.get("zip") != _zip_fingerprint(zip_path)
+        or not manifest.get("files")
+    )
+
+
+def _unchanged_result(manifest):
+    """Sync summary for a store already up to date with its archive"""
+    return {
+        "num_documents": len(manifest["files"]),
+        "added": 0, "modified": 0, "removed": 0,
+        "unchanged": len(manifest["files"]),
+        "index_version": manifest.get("index_version"),
+        "chunks": 0, "chunks_per_sec": 0.0, "timings": {},
+    }
+
+
+def sync_vector_store(zip_path, db_dir, embedding, on_error=None, batch_size=INGEST_BATCH_SIZE,
+                      engine=None, chunker=None, progress=None):
+    """
+    Bring the persisted Chroma collection in line with the ZIP archive.
+
+    Members are streamed from the archive without extracting to disk, and
+    only articles whose content hash changed since the last run are
+    re-chunked and re-embedded, in fixed-size batches; deleted articles have
+    their chunks removed. When the archive itself is untouched the existing
+    collection is reused as is. Changed chunks are embedded by an
+    EmbeddingEngine and upserted into the collection in bulk. Returns a dict
+    summarising what changed, with per-stage timings and throughput.
+
+    After every batch the manifest is checkpointed with the articles whose
+    chunks are all stored, so an interrupted run resumes where it stopped.
+    `progress(done, total)` is called with the number of archive articles
+    processed so far.
+    """
+    with ExitStack() as cleanup:
+        # Owned pools are shut down (and the embedding cache flushed) even when a batch fails
+        if chunker is None:
+            chunker = cleanup.enter_context(closing(Chunker()))
+        settings = _settings(getattr(embedding, "model_name", None), chunker)
+        manifest = load_manifest(db_dir)
+        if manifest is None or manifest.get("settings") != settings or not os.path.isdir(db_dir):
+            # Unknown state or different chunker/model: start from scratch
+            shutil.rmtree(db_dir, ignore_errors=True)
+            manifest = {"settings": settings, "zip": None, "files": {}, "index_version": None}
+
+        fingerprint = _zip_fingerprint(zip_path)
+        if manifest["zip"] == fingerprint and manifest["files"]:
+            return _unchanged_result(manifest)
+
+        from langchain_community.vectorstores import Chroma
+
+        previous = manifest["files"]
+        vectordb = Chroma(persist_directory=db_dir, embedding_function=embedding)
+
+        if engine is None:
+            engine = cleanup.enter_context(closing(EmbeddingEngine.from_embeddings(embedding)))
+        collection = vectordb._collection
+        timings = defaultdict(float)
+        num_chunks = 0
+        started = time.perf_counter()
+
+        seen, counts = {}, {}
+        deleted_sources = set()
+        # Checkpointed state: complete articles only, and never mistaken for a finished run
+        checkpoint = {**manifest, "zip": None, "files": dict(previous)}
+        stored = defaultdict(int)
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            total = sum(1 for info in zip_ref.infolist() if _is_article(info))
+            articles = iter_changed_articles(zip_ref, previous, seen, on_error, timings)
+            for batch in iter_chunk_batches(articles, counts, chunker, batch_size, timings):
+                # Drop the old chunks of modified articles before re-adding them
+                stale_ids = []
+                for source in counts.keys() - deleted_sources:
+                    if source in previous:
+                        stale_ids.extend(chunk_ids(source, previous[source]["chunks"]))
+                    deleted_sources.add(source)
+                if stale_ids:
+                    with _timed(timings, "persist"):
+                        vectordb.delete(ids=stale_ids)
+
+                texts = [record.text for record in batch]
+                with _timed(timings, "embed"):
+                    vectors = engine.embed(texts)
+                # Lets readers estimate the index's memory footprint
+                manifest["dim"] = checkpoint["dim"] = int(vectors.shape[1])
+                with _timed(timings, "persist"):
+                    collection.upsert(
+                        ids=[record.chunk_id for record in batch],
+                        embeddings=vectors.tolist(),
+                        documents=texts,
+                        metadatas=[record.vector_metadata() for record in batch]
+                    )
+                num_chunks += len(batch)
+
+                finished = set()
+                for record in batch:
+                    stored[record.doc_id] += 1
+                    if stored[record.doc_id] == counts[record.doc_id][1]:
+                        finished.add(record.doc_id)
+                for source in finished:
+                    digest, source_chunks = counts[source]
+                    checkpoint["files"][source] = {"sha256": digest, "chunks": source_chunks}
+                with _timed(timings, "persist"):
+                    vectordb.persist()
+                    save_manifest(db_dir, checkpoint)
+                if progress:
+                    progress(len(seen), total)
+
+        # Articles that produced no chunks never reached a batch
+        modified = [source for source in counts if source in previous]
+        stale_ids = []
+        for source in (previous.keys() - seen.keys()) | (set(modified) - deleted_sources):
+            stale_ids.extend(chunk_ids(source, previous[source]["chunks"]))
+        if stale_ids:
+            vectordb.delete(ids=stale_ids)
+
+        removed = [source for source in previous if source not in seen]
+        for source in removed:
+            del previous[source]
+        for source, (digest, source_chunks) in counts.items():
+            previous[source] = {"sha256": digest, "chunks": source_chunks}
+
+        if counts or removed or not manifest.get("index_version"):
+            # Lets caches keyed on the index tell old results from new ones
+            manifest["index_version"] = uuid.uuid4().hex[:12]
+
+        with _timed(timings, "persist"):
+            vectordb.persist()
+            manifest["zip"] = fingerprint
+            save_manifest(db_dir, manifest)
+        if progress:
+            progress(total, total)
+        elapsed = time.perf_counter() - started
+        telemetry.record_trace(
+            "ingest", {**timings, "total": elapsed},
+            counts={"chunks": num_chunks, "articles": len(counts)},
+            attributes={"index_version": manifest["index_version"], "removed": len(removed)}
+        )
+        logger.info(
+            "Ingested %d chunks in %.2fs (%.1f chunks/s, embed %.1f chunks/s); stages: %s",
+            num_chunks, elapsed, num_chunks / elapsed if elapsed else 0.0, engine.throughput(),
+            ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in sorted(timings.items()))
+        )
+
+        return {
+            "num_documents": len(previous),
+            "added": len(counts) - len(modified),
+            "modified": len(modified),
+            "removed": len(removed),
+            "unchanged": len(seen) - len(counts),
+            "index_version": manifest["index_version"],
+            "chunks": num_chunks,
+            "chunks_per_sec": num_chunks / elapsed if elapsed else 0.0,
+            "timings": dict(timings),
+        }
+
+
+def _remove_old_versions(root, keep):
+    for path in Path(root).iterdir():
+        if path.is_dir() and path.name.startswith(VERSION_PREFIX) and path.name not in keep:
+            # Still-open stores (e.g. on Windows) are retried after the next refresh
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def refresh_store(zip_path, root, embedding, on_error=None, progress=None, engine=None, chunker=None):
+    """
+    Bring a versioned store under `root` up to date without touching the
+    live version: the live store is copied to a new v-<id> directory, the
+    copy is synced with the archive and CURRENT is then switched to it in
+    one atomic rename. A build interrupted part-way is resumed from its
+    checkpoint on the next call. The previous version is kept for readers
+    that still have it open. Returns the sync summary plus "store_dir" and
+    "swapped".
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    active = active_store_dir(root)
+    with ExitStack() as cleanup:
+        if chunker is None:
+            chunker = cleanup.enter_context(closing(Chunker()))
+        name = _read_pointer(root / BUILDING_FILE)
+        if name is None or not (root / name).is_dir():
+            if not needs_sync(zip_path, active, embedding, chunker):
+                return {**_unchanged_result(load_manifest(active)), "store_dir": active, "swapped": False}
+            name = VERSION_PREFIX + uuid.uuid4().hex[:12]
+            live_manifest = load_manifest(active)
+            if live_manifest and live_manifest.get("settings") == _settings(getattr(embedding, "model_name", None), chunker):
+                # Start from the live chunks so only changed articles are embedded
+                shutil.copytree(active, root / name, ignore=lambda directory, names: [
+                    n for n in names
+                    if Path(directory) == root and (n.startswith(VERSION_PREFIX) or n in (CURRENT_FILE, BUILDING_FILE))
+                ])
+                manifest = load_manifest(root / name)
+                # The copy will differ from the live version, so it needs its own id
+                manifest["index_version"] = None
+                save_manifest(root / name, manifest)
+            _write_pointer(root / BUILDING_FILE, name)
+
+        result = sync_vector_store(
+            zip_path, str(root / name), embedding, on_error, engine=engine, chunker=chunker, progress=progress
+        )
+    _write_pointer(root / CURRENT_FILE, name)
+    (root / BUILDING_FILE).unlink()
+    _remove_old_versions(root, keep={name, Path(active).name})
+    result["store_dir"] = str(root / name)
+    result["swapped"] = True
+    return result
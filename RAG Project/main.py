@@ -1,49 +1,41 @@
 import streamlit as st
-import zipfile, os, shutil
-from pathlib import Path
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-from evaluation import evaluate_f1  
-import nltk
-from langchain.schema import Document
+import os
+import time
+import uuid
 from dotenv import load_dotenv  # <-- NEW
 
+# Startup report: time from here until the header and controls are drawn
+script_started = time.perf_counter()
+
+import prefetch
+import resources
+import telemetry
+from chat_history import ChatMessage, visible_window
+from context_packer import RollingSummary
+from config import SHOW_STAGE_TIMINGS, CHAT_RENDER_WINDOW
+
 # Import enhanced UI components
 from ui_components import (
     load_custom_css, render_main_header, create_chat_controls,
-    create_clear_chat_button, render_user_message, render_ai_message,
-    render_ai_message_with_metrics, render_welcome_message, 
+    create_clear_chat_button, create_corpus_selector, render_user_message, render_ai_message,
+    render_chat_window, create_load_earlier_button, render_welcome_message, 
     render_setup_message, render_document_success_popup,
-    render_loading_modal
+    render_loading_modal, render_ingest_progress, render_warmup_status, render_timing_report
 )
 
 # Load environment variables
 load_dotenv()  # <-- NEW
 
+# Print the JSON trace log, prompt sizes and ingestion reports
+telemetry.configure_logging()
 
-def sentence_chunk_documents(documents, sentences_per_chunk=3):
-    """Split documents into sentence-based chunks"""
-    chunked_docs = []
-
-    for doc in documents:
-        sentences = nltk.sent_tokenize(doc.page_content)
+# Read NLTK data and model weights from the build-time snapshot (python prefetch.py)
+prefetch.use_local_cache()
 
-        for i in range(0, len(sentences), sentences_per_chunk):
-            chunk_sentences = sentences[i:i + sentences_per_chunk]
-            if chunk_sentences:
-                chunk_text = ' '.join(chunk_sentences)
-                chunked_doc = Document(
-                    page_content=chunk_text,
-                    metadata=doc.metadata.copy()
-                )
-                chunked_docs.append(chunked_doc)
-
-    return chunked_docs
+# Start loading the shared embedding model and LLM client (once per process)
+resources.warm_up()
+# Optional Prometheus /metrics endpoint (METRICS_PORT)
+resources.get_metrics_server()
 
 
 def get_prompt_template(answer_type):
@@ -98,135 +90,133 @@ st.set_page_config(
 # Load enhanced CSS
 load_custom_css()
 
-# Constants
-TEMP_DIR = "extracted_files"
-VECTOR_DB_DIR = "vector_store"
-EMBED_MODEL = "BAAI/bge-base-en-v1.5"
-ZIP_PATH = r"D:\\data.zip" 
-
 # --- Session State ---
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_RENDER_WINDOW
 if "vectordb_ready" not in st.session_state:
     st.session_state.vectordb_ready = False
 if "num_documents" not in st.session_state:
     st.session_state.num_documents = 0
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = RollingSummary()
+
+# --- Header & Chat Controls (drawn before any model or langchain import) ---
+render_main_header()
+answer_type, gold_standard = create_chat_controls()
+
+if not resources.is_ready():
+    @st.fragment(run_every=2)
+    def show_warmup_status():
+        render_warmup_status(resources.health())
+    show_warmup_status()
+resources.record_startup("first_render", time.perf_counter() - script_started)
+
 if "memory" not in st.session_state:
+    from langchain.memory import ConversationBufferMemory
     st.session_state.memory = ConversationBufferMemory(
         memory_key="chat_history", 
         return_messages=True,
         output_key="answer"
     )
 
-# --- Header ---
-render_main_header()
+# --- Document Loading (Background Worker) ---
+# Each corpus is ingested on a shared worker thread. Queries keep using a
+# corpus's live index version while a refresh builds, and switch once it
+# is swapped in.
+corpora = resources.get_corpora()
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {
+        name: resources.submit_ingestion(name)
+        for name, zip_path in corpora.zip_paths.items() if os.path.exists(zip_path)
+    }
+ingest_jobs = st.session_state.ingest_jobs
 
-# --- Document Loading (Background Process) ---
 if not st.session_state.vectordb_ready:
-    if os.path.exists(ZIP_PATH):
-        # Show loading modal
-        loading_placeholder = st.empty()
-        with loading_placeholder.container():
+    num_documents = resources.get_num_documents()
+    if num_documents:
+        st.session_state.vectordb_ready = True
+        st.session_state.num_documents = num_documents
+        render_document_success_popup(num_documents)
+    elif not ingest_jobs:
+        st.error(f"❌ ZIP file not found: {', '.join(corpora.zip_paths.values())}")
+    else:
+        statuses = [job.status() for job in ingest_jobs.values()]
+        if any(status["state"] in ("queued", "running") for status in statuses):
             render_loading_modal("Processing medical documents...")
+            for status in statuses:
+                render_ingest_progress(status, f"Building {status['name']} knowledge base")
+            time.sleep(1)
+            st.rerun()
+        errors = [status["error"] for status in statuses if status["state"] == "error"]
+        if errors:
+            st.error(f"❌ Error processing ZIP file: {errors[0]}")
+        else:
+            st.error("❌ No .txt files found in the ZIP!")
 
-        with st.spinner("🔄 Loading medical knowledge base..."):
-            try:
-                # Step 1: Extract ZIP
-                shutil.rmtree(TEMP_DIR, ignore_errors=True)
-                os.makedirs(TEMP_DIR, exist_ok=True)
-                with zipfile.ZipFile(ZIP_PATH, "r") as zip_ref:
-                    zip_ref.extractall(TEMP_DIR)
-
-                # Step 2: Load all .txt files
-                documents = []
-                for file_path in Path(TEMP_DIR).rglob("*.txt"):
-                    try:
-                        loader = TextLoader(str(file_path), encoding="utf-8")
-                        documents.extend(loader.load())
-                    except Exception as e:
-                        st.error(f"Error loading {file_path}: {e}")
-
-                if documents:
-                    # Step 3: Apply sentence chunking
-                    chunked_documents = sentence_chunk_documents(documents)
-
-                    # Step 4: Create embeddings and vector store
-                    embedding = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-                    shutil.rmtree(VECTOR_DB_DIR, ignore_errors=True)
-                    vectordb = Chroma.from_documents(chunked_documents, embedding, persist_directory=VECTOR_DB_DIR)
-                    vectordb.persist()
-
-                    # Update session state
-                    st.session_state.vectordb_ready = True
-                    st.session_state.num_documents = len(documents)
-
-                    # Clear loading modal
-                    loading_placeholder.empty()
-
-                    # Show success popup
-                    render_document_success_popup(len(documents))
-                    st.rerun()
-                else:
-                    loading_placeholder.empty()
-                    st.error("❌ No .txt files found in the ZIP!")
-            except Exception as e:
-                loading_placeholder.empty()
-                st.error(f"❌ Error processing ZIP file: {e}")
-    else:
-        st.error(f"❌ ZIP file not found: {ZIP_PATH}")
+# --- Startup & Ingestion Timings (sidebar) ---
+if SHOW_STAGE_TIMINGS:
+    render_timing_report(
+        resources.startup_report(),
+        {name: job.result for name, job in ingest_jobs.items() if job.result and job.result["chunks"]}
+    )
 
 # --- Main Chat Interface ---
 if st.session_state.vectordb_ready:
-    # Initialize vector database
-    vectordb = Chroma(persist_directory=VECTOR_DB_DIR, embedding_function=HuggingFaceEmbeddings(model_name=EMBED_MODEL))
-    retriever = vectordb.as_retriever(search_kwargs={"k": 3})
-
-    # --- Chat Controls (Answer Type & Evaluation) ---
-    answer_type, gold_standard = create_chat_controls()
+    # Shared answering service (one event loop, Chroma client, embedding model and cache set per process)
+    answer_service = resources.get_answer_service()
 
     # --- Dynamic Prompt Template ---
+    from langchain.prompts import PromptTemplate
     template = get_prompt_template(answer_type)
     prompt = PromptTemplate(
         input_variables=["context", "chat_history", "question"], 
         template=template
     )
 
-    # --- Groq LLM Setup ---
-    groq_key = os.getenv("GROQ_API_KEY")  # <-- fetch from env
-    llm = ChatGroq(
-        api_key=groq_key,
-        model_name="llama3-70b-8192"
-    )
-    qa_chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=retriever,
-        memory=st.session_state.memory,
-        combine_docs_chain_kwargs={"prompt": prompt},
-        return_source_documents=True
+    # --- Corpus Selection (only corpora that have been indexed) ---
+    selected_corpora = create_corpus_selector(
+        [name for name in corpora.names if corpora.info(name)["num_documents"]]
     )
+
+    # --- Background Refresh Progress ---
+    if any(job.active for job in ingest_jobs.values()):
+        @st.fragment(run_every=2)
+        def show_refresh_progress():
+            for job in ingest_jobs.values():
+                status = job.status()
+                if status["state"] in ("queued", "running"):
+                    render_ingest_progress(status, f"Refreshing {status['name']} knowledge base in the background")
+        show_refresh_progress()
+    for job in ingest_jobs.values():
+        if job.file_errors:
+            st.warning(f"⚠️ {len(job.file_errors)} files in {job.name} could not be loaded (first: {job.file_errors[0][0]})")
+
     # --- Chat History Display ---
     st.markdown("### 💬 Medical Research Conversation")
 
     if not st.session_state.chat_history:
         render_welcome_message()
 
-    for item in st.session_state.chat_history:
-        role = item[0]
-        msg = item[1]
-
-        if role == "user":
-            render_user_message(msg)
+    # Sessions started before history records: convert the old tuples once
+    if any(isinstance(item, tuple) for item in st.session_state.chat_history):
+        st.session_state.chat_history = [
+            ChatMessage.from_tuple(item) if isinstance(item, tuple) else item
+            for item in st.session_state.chat_history
+        ]
+
+    # Only the most recent messages are rendered; older ones on request
+    hidden, window = visible_window(st.session_state.chat_history, st.session_state.chat_window)
+    if hidden and create_load_earlier_button(hidden):
+        st.session_state.chat_window += CHAT_RENDER_WINDOW
+        st.rerun()
+    render_chat_window(window, SHOW_STAGE_TIMINGS)
 
-        elif role == "ai":
-            ans_type = item[2] if len(item) > 2 else "Basic Answer"
-            gold_std = item[3] if len(item) > 3 and item[3] else None
-
-            if gold_std:
-                # Calculate evaluation metrics and render with metrics
-                precision, recall, f1 = evaluate_f1(gold_std, msg)
-                render_ai_message_with_metrics(msg, ans_type, precision, recall, f1)
-            else:
-                render_ai_message(msg, ans_type)
+    # The in-flight turn streams here, below the existing conversation
+    live_turn = st.container()
 
     # --- Chat Input ---
     st.markdown("### 💭 Ask Your Medical Question")
@@ -235,7 +225,9 @@ if st.session_state.vectordb_ready:
     # --- Clear Chat Button (Below Input) ---
     if create_clear_chat_button():
         st.session_state.chat_history = []
+        st.session_state.chat_window = CHAT_RENDER_WINDOW
         st.session_state.memory.clear()
+        st.session_state.history_summary.clear()
         st.success("🗑️ Chat history cleared!")
         st.rerun()
 
@@ -245,9 +237,10 @@ if st.session_state.vectordb_ready:
         history_keywords = ["first question", "previous question", "what did i ask", "conversation history", "before", "earlier"]
         is_history_question = any(keyword in user_question.lower() for keyword in history_keywords)
 
+        generation = trace = None
         if is_history_question and st.session_state.chat_history:
             # Handle history questions directly
-            user_questions = [item[1] for item in st.session_state.chat_history if item[0] == "user"]
+            user_questions = [message.text for message in st.session_state.chat_history if message.role == "user"]
             if "first" in user_question.lower() and user_questions:
                 answer = f"Your first question was: '{user_questions[0]}'"
             elif user_questions:
@@ -255,15 +248,35 @@ if st.session_state.vectordb_ready:
             else:
                 answer = "You haven't asked any questions yet in this conversation."
         else:
-            # Handle normal medical questions
-            result = qa_chain({"question": user_question})
+            # Handle normal medical questions, streaming tokens into the chat
+            with live_turn:
+                render_user_message(user_question)
+                answer_placeholder = st.empty()
+                render_ai_message("⏳", answer_type, placeholder=answer_placeholder)
+            # A newer question from this session cancels the one still in flight
+            handle = answer_service.submit(
+                st.session_state.session_id, user_question, prompt,
+                st.session_state.memory, answer_type,
+                summary=st.session_state.history_summary,
+                corpora=selected_corpora
+            )
+            for partial in handle.partials():
+                render_ai_message(partial + " ▌", answer_type, placeholder=answer_placeholder)
+            result = handle.result()
             answer = result["answer"]
+            generation = result["generation"]
+            trace = result["trace"]
+
+        # Score against the gold answer once, not on every rerun
+        metrics = resources.get_evaluator().evaluate(gold_standard, answer) if gold_standard else None
 
         # Add to display history
-        st.session_state.chat_history.append(("user", user_question))
-        st.session_state.chat_history.append(("ai", answer, answer_type, gold_standard))
+        st.session_state.chat_history.append(ChatMessage.user(user_question))
+        st.session_state.chat_history.append(
+            ChatMessage.ai(answer, answer_type, gold_standard, generation, metrics, trace)
+        )
         st.rerun()
 
 else:
     # Show setup message when documents are not ready
-    render_setup_message()
\ No newline at end of file
+    render_setup_message()
\ No newline at end of file
@@ -0,0 +1,124 @@
+# prefetch.py
+#
+# Build-time prefetch of everything the app would otherwise download on its
+# first start: the NLTK sentence tokenizer data and the Hugging Face weights
+# of the embedding (and, when enabled, re-ranking) model. Run it once while
+# building the image so new replicas start from a warm local cache:
+#
+#   python prefetch.py
+#   python prefetch.py --report    # import time of each heavy dependency
+#
+# At startup main.py calls use_local_cache(), which points NLTK and Hugging
+# Face at MODEL_CACHE_DIR and, once every model is there, turns off the Hub's
+# network checks.
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+from config import EMBED_MODEL, RERANK_ENABLED, RERANK_MODEL, MODEL_CACHE_DIR
+
+# "punkt_tab" is what NLTK >= 3.8.2 loads for sent_tokenize; older releases use "punkt"
+NLTK_PACKAGES = ("punkt", "punkt_tab")
+# Framework variants sentence-transformers never loads
+_IGNORE_PATTERNS = ["*.onnx", "onnx/*", "openvino/*", "*.h5", "*.msgpack", "*.ot"]
+# Heavy dependencies in the order the app first touches them
+HEAVY_MODULES = (
+    "streamlit", "nltk", "langchain.prompts", "langchain.memory",
+    "langchain_community.vectorstores", "langchain_community.embeddings",
+    "langchain_groq", "sentence_transformers",
+)
+_MANIFEST = "prefetch.json"
+
+
+def required_models():
+    return [EMBED_MODEL] + ([RERANK_MODEL] if RERANK_ENABLED else [])
+
+
+def _paths(cache_dir):
+    return os.path.join(cache_dir, "nltk_data"), os.path.join(cache_dir, "huggingface")
+
+
+def prefetch(cache_dir=MODEL_CACHE_DIR, models=None):
+    """Download NLTK data and model snapshots into `cache_dir`; returns the manifest written"""
+    import nltk
+    from huggingface_hub import snapshot_download
+
+    nltk_dir, hub_dir = _paths(cache_dir)
+    models = list(models or required_models())
+    for package in NLTK_PACKAGES:
+        nltk.download(package, download_dir=nltk_dir, quiet=True)
+    for model in models:
+        snapshot_download(model, cache_dir=hub_dir, ignore_patterns=_IGNORE_PATTERNS)
+
+    manifest = {"models": models, "nltk": list(NLTK_PACKAGES), "created_at": time.time()}
+    with open(os.path.join(cache_dir, _MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def use_local_cache(cache_dir=MODEL_CACHE_DIR):
+    """
+    Point NLTK and Hugging Face at a prefetched `cache_dir` (variables
+    already set in the environment win). Must run before those libraries
+    are imported. Returns False when nothing was prefetched.
+    """
+    try:
+        with open(os.path.join(cache_dir, _MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    nltk_dir, hub_dir = _paths(os.path.abspath(cache_dir))
+    os.environ.setdefault("NLTK_DATA", nltk_dir)
+    if "nltk" in sys.modules:
+        sys.modules["nltk"].data.path.insert(0, nltk_dir)
+    os.environ.setdefault("HF_HUB_CACHE", hub_dir)
+    os.environ.setdefault("HUGGINGFACE_HUB_CACHE", hub_dir)
+    # A model missing from the snapshot still has to be downloaded
+    if set(required_models()) <= set(manifest.get("models", [])):
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    return True
+
+
+def import_report(modules=HEAVY_MODULES):
+    """(module, seconds) for importing each module in turn; shared dependencies count once"""
+    report = []
+    for module in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            report.append((module, None))
+            continue
+        report.append((module, time.perf_counter() - start))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch NLTK data and model weights for a fast cold start")
+    parser.add_argument("--cache-dir", default=MODEL_CACHE_DIR)
+    parser.add_argument("--report", action="store_true", help="only print import times of the heavy dependencies")
+    args = parser.parse_args()
+
+    if args.report:
+        use_local_cache(args.cache_dir)
+        report = import_report()
+        for module, seconds in report:
+            print(f"{module:<36} {'not installed' if seconds is None else f'{seconds * 1000:8.1f} ms'}")
+        print(f"{'total':<36} {sum(seconds or 0.0 for _, seconds in report) * 1000:8.1f} ms")
+        return
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    manifest = prefetch(args.cache_dir)
+    print(f"Prefetched {', '.join(manifest['models'])} and NLTK {', '.join(manifest['nltk'])} "
+          f"into {args.cache_dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# qa_pipeline.py
+
+import asyncio
+import contextlib
+import logging
+import time
+
+import telemetry
+from config import LLM_MODEL, RETRIEVER_K
+from context_packer import ContextPacker
+from query_cache import QueryCaches, normalize_question
+from question_rewriter import QuestionRewriter
+
+logger = logging.getLogger(__name__)
+
+
+def history_lines(messages):
+    """One "Human: ..." / "Assistant: ..." line per memory message"""
+    return [
+        f"{'Human' if message.type == 'human' else 'Assistant'}: {message.content}"
+        for message in messages
+    ]
+
+
+def format_chat_history(messages):
+    """Render memory messages the way ConversationalRetrievalChain does"""
+    lines = history_lines(messages)
+    return "\n" + "\n".join(lines) if lines else ""
+
+
+def doc_chunk_id(doc):
+    """Stable id of a retrieved chunk (falls back to its text), qualified by its corpus"""
+    chunk_id = doc.metadata.get("chunk_id") or doc.page_content
+    corpus = doc.metadata.get("corpus")
+    return f"{corpus}:{chunk_id}" if corpus else chunk_id
+
+
+class DenseSearcher:
+    """Nearest-neighbour search over the Chroma collection"""
+
+    def __init__(self, vectordb):
+        self.vectordb = vectordb
+
+    def search(self, question, vector, k):
+        return self.vectordb.similarity_search_by_vector(vector, k=k)
+
+
+class QAPipeline:
+    """
+    Conversational retrieval QA split into explicit stages: condense the
+    follow-up question against chat history, embed it, retrieve chunks and
+    generate the answer from the "stuffed" prompt. Each stage consults the
+    layered QueryCaches before doing work; with a SemanticCache attached,
+    paraphrases of earlier questions are answered without retrieval or an
+    LLM call. An optional reranker narrows a wider candidate set down to
+    the best `k` chunks before they are stuffed into the prompt, and the
+    ContextPacker keeps chat history and context under a token budget.
+
+    The stages are awaitable: LLM calls use the async Groq client and the
+    blocking embedding/search work runs in worker threads, so many questions
+    can be in flight on one event loop. `answer()` is a blocking wrapper.
+    """
+
+    def __init__(self, llm, embeddings, searcher, caches=None, index_version=None,
+                 k=RETRIEVER_K, model_name=LLM_MODEL, semantic_cache=None, reranker=None, packer=None,
+                 rewriter=None, summary_llm=None):
+        self.llm = llm
+        self.summary_llm = summary_llm or llm
+        self.embeddings = embeddings
+        self.searcher = searcher
+        self.caches = caches or QueryCaches()
+        self.index_version = index_version
+        self.k = k
+        self.model_name = model_name
+        self.semantic_cache = semantic_cache
+        self.reranker = reranker
+        self.packer = packer or ContextPacker()
+        self.rewriter = rewriter or QuestionRewriter(llm)
+        self.fetch_k = max(k, reranker.fetch_k) if reranker is not None else k
+        # Summary updates running after their answer (held so they are not garbage collected)
+        self._folds = set()
+
+    async def acondense_question(self, question, chat_history, llm_limiter=None, last_exchange=None):
+        """Rewrite a follow-up into a standalone question (LLM call only when the rewriter needs one)"""
+        return await self.rewriter.arewrite(question, chat_history, llm_limiter, last_exchange)
+
+    def embed_query(self, question):
+        key = normalize_question(question)
+        vector = self.caches.embeddings.get(key)
+        telemetry.count("cache_lookups", layer="embedding", result="miss" if vector is None else "hit")
+        if vector is None:
+            with telemetry.span("embed"):
+                vector = self.embeddings.embed_query(question)
+            self.caches.embeddings.set(key, vector)
+        return vector
+
+    def retrieve(self, question):
+        key = self.caches.retrieval_key(question, self.fetch_k, self.index_version)
+        docs = self.caches.retrieval.get(key)
+        telemetry.count("cache_lookups", layer="retrieval", result="miss" if docs is None else "hit")
+        if docs is None:
+            vector = self.embed_query(question)
+            with telemetry.span("retrieve"):
+                docs = self.searcher.search(question, vector, self.fetch_k)
+            self.caches.retrieval.set(key, docs)
+        return docs
+
+    def rerank(self, question, docs):
+        if self.reranker is None:
+            return docs
+        with telemetry.span("rerank"):
+            return self.reranker.rerank(question, docs, self.k)
+
+    def pack_history(self, messages, summary=None):
+        """
+        Chat history for the prompts: the rolling `summary` plus the most
+        recent unsummarised turns that fit the history budget. Without a
+        summary object older turns are simply dropped.
+        """
+        recent = messages[summary.covered:] if summary is not None else messages
+        return self.packer.format_history(summary.text if summary is not None else "", history_lines(recent))
+
+    async def afold_history(self, messages, summary, llm_limiter=None):
+        """
+        Fold the oldest unsummarised turns into `summary` once they no
+        longer fit the history budget (one call to `summary_llm`, none
+        while they fit).
+        """
+        pending = messages[summary.covered:]
+        count = self.packer.fold_count(history_lines(pending), summary.text)
+        if not count:
+            return
+        from langchain.memory.prompt import SUMMARY_PROMPT
+
+        covered, resets = summary.covered, summary.resets
+        summary_prompt = SUMMARY_PROMPT.format(summary=summary.text, new_lines=format_chat_history(pending[:count]))
+        async with llm_limiter or contextlib.nullcontext():
+            with telemetry.span("summarize"):
+                text = (await self.summary_llm.ainvoke(summary_prompt)).content
+        if summary.resets == resets and summary.covered == covered:
+            summary.text = text
+            summary.covered = covered + count
+
+    def _schedule_fold(self, memory, summary, llm_limiter):
+        # Runs after the answer has streamed: the next question sees the
+        # updated summary and this one never waits for it
+        if summary is None or summary.folding:
+            return
+        messages = memory.load_memory_variables({})["chat_history"]
+        summary.folding = True
+        task = asyncio.create_task(self._fold(messages, summary, llm_limiter))
+        self._folds.add(task)
+        task.add_done_callback(self._folds.discard)
+
+    async def _fold(self, messages, summary, llm_limiter):
+        try:
+            with telemetry.start_trace("summarize"):
+                await self.afold_history(messages, summary, llm_limiter)
+        except Exception:
+            logger.exception("Updating the conversation summary failed")
+        finally:
+            summary.folding = False
+
+    async def astream_completion(self, prompt_text, on_token=None):
+        """
+        Stream the LLM answer, calling `on_token(text_so_far)` per chunk.
+        Returns (answer, stats) with time-to-first-token and tokens/sec; the
+        token count is the number of streamed chunks, which Groq emits
+        roughly one per token.
+        """
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        async for chunk in self.llm.astream(prompt_text):
+            if not chunk.content:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(chunk.content)
+            if on_token:
+                on_token("".join(parts))
+        end = time.perf_counter()
+
+        generation_time = end - (first_token_at or end)
+        stats = {
+            "ttft": (first_token_at or end) - start,
+            "tokens": len(parts),
+            "tokens_per_sec": len(parts) / generation_time if generation_time > 0 else 0.0,
+            "total": end - start,
+        }
+        return "".join(parts), stats
+
+    async def agenerate(self, prompt, docs, chat_history, question, on_token=None, llm_limiter=None):
+        key = self.caches.answer_key(prompt.template, [doc_chunk_id(doc) for doc in docs], question, self.model_name)
+        answer = self.caches.answers.get(key)
+        telemetry.count("cache_lookups", layer="answer", result="miss" if answer is None else "hit")
+        if answer is not None:
+            if on_token:
+                on_token(answer)
+            return answer, True, None
+        with telemetry.span("pack"):
+            prompt_text, packing = self.packer.pack(prompt, docs, chat_history, question)
+        logger.info(
+            "Prompt tokens: %d (context %d in %d chunks, history %d)",
+            packing["prompt_tokens"], packing["context_tokens"], packing["chunks"], packing["history_tokens"]
+        )
+        async with llm_limiter or contextlib.nullcontext():
+            with telemetry.span("generate"):
+                answer, stats = await self.astream_completion(prompt_text, on_token)
+        stats.update(packing)
+        telemetry.count("tokens", packing["prompt_tokens"], type="prompt")
+        telemetry.count("tokens", stats["tokens"], type="completion")
+        telemetry.annotate(ttft=stats["ttft"], tokens_per_sec=stats["tokens_per_sec"])
+        self.caches.answers.set(key, answer)
+        return answer, False, stats
+
+    async def aanswer(self, question, prompt, memory, answer_type=None, on_token=None,
+                      llm_limiter=None, summary=None):
+        """
+        Answer `question` with `prompt`, recording the turn in `memory`.
+        `on_token` receives the partial answer as it streams in and
+        `llm_limiter` (an asyncio semaphore) bounds concurrent LLM calls.
+        `summary` is the session's RollingSummary of older turns.
+        Cancelling the task leaves `memory` untouched. The result carries
+        the question's trace (per-stage seconds, token counts, cache hits).
+        """
+        with telemetry.start_trace("question") as trace:
+            result = await self._aanswer(question, prompt, memory, answer_type, on_token, llm_limiter, summary)
+        result["trace"] = trace.as_dict()
+        return result
+
+    async def _aanswer(self, question, prompt, memory, answer_type, on_token, llm_limiter, summary):
+        messages = memory.load_memory_variables({})["chat_history"]
+        chat_history = self.pack_history(messages, summary)
+        standalone_question = await self.acondense_question(
+            question, chat_history, llm_limiter, last_exchange=history_lines(messages[-2:])
+        )
+
+        if self.semantic_cache is not None:
+            vector = await asyncio.to_thread(self.embed_query, standalone_question)
+            with telemetry.span("semantic_cache"):
+                hit = self.semantic_cache.lookup(standalone_question, vector, answer_type, self.index_version)
+            telemetry.count("cache_lookups", layer="semantic", result="miss" if hit is None else "hit")
+            if hit is not None:
+                entry, similarity = hit
+                if on_token:
+                    on_token(entry["answer"])
+                memory.save_context({"question": question}, {"answer": entry["answer"]})
+                self._schedule_fold(memory, summary, llm_limiter)
+                return {
+                    "answer": entry["answer"],
+                    "source_documents": [],
+                    "source_chunk_ids": entry["chunk_ids"],
+                    "generated_question": standalone_question,
+                    "cached": True,
+                    "semantic_match": {"question": entry["question"], "similarity": similarity},
+                    "generation": None,
+                }
+
+        docs = await asyncio.to_thread(self.retrieve, standalone_question)
+        docs = await asyncio.to_thread(self.rerank, standalone_question, docs)
+        answer, cached, generation = await self.agenerate(
+            prompt, docs, chat_history, standalone_question, on_token, llm_limiter
+        )
+        chunk_ids = [doc_chunk_id(doc) for doc in docs]
+        if self.semantic_cache is not None and not cached:
+            self.semantic_cache.add(standalone_question, vector, answer, answer_type, chunk_ids, self.index_version)
+        memory.save_context({"question": question}, {"answer": answer})
+        self._schedule_fold(memory, summary, llm_limiter)
+        return {
+            "answer": answer,
+            "source_documents": docs,
+            "source_chunk_ids": chunk_ids,
+            "generated_question": standalone_question,
+            "cached": cached,
+            "semantic_match": None,
+            "generation": generation,
+        }
+
+    def answer(self, question, prompt, memory, answer_type=None, on_token=None, summary=None):
+        """Blocking version of aanswer() for callers without an event loop"""
+        return asyncio.run(self.aanswer(question, prompt, memory, answer_type, on_token, summary=summary))
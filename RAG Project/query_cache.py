@@ -0,0 +1,95 @@
+# query_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+
+
+def normalize_question(question):
+    """Case- and whitespace-insensitive form of a question used in cache keys"""
+    return " ".join(question.lower().split())
+
+
+def template_hash(template):
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and entry[1] < time.monotonic()):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class QueryCaches:
+    """
+    Layered caches for the question path:
+
+    - embeddings: normalised query -> query vector
+    - retrieval:  (normalised query, k, index version) -> retrieved documents
+    - answers:    (prompt template, retrieved chunk ids, normalised question,
+                  model) -> answer text
+
+    Retrieval and answer keys include the index version / chunk ids, so a
+    re-indexed corpus never serves stale entries; `invalidate()` also drops
+    them eagerly when the index changes.
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.embeddings = TTLCache(maxsize, ttl)
+        self.retrieval = TTLCache(maxsize, ttl)
+        self.answers = TTLCache(maxsize, ttl)
+
+    @staticmethod
+    def retrieval_key(question, k, index_version):
+        return (normalize_question(question), k, index_version)
+
+    @staticmethod
+    def answer_key(template, chunk_ids, question, model):
+        return (template_hash(template), tuple(chunk_ids), normalize_question(question), model)
+
+    def invalidate(self):
+        """Drop everything derived from the current index"""
+        self.retrieval.clear()
+        self.answers.clear()
+
+    def stats(self):
+        return {
+            name: {"hits": cache.hits, "misses": cache.misses, "size": len(cache)}
+            for name, cache in (("embeddings", self.embeddings), ("retrieval", self.retrieval), ("answers", self.answers))
+        }
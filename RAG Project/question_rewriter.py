@@ -0,0 +1,84 @@
+# question_rewriter.py
+
+import contextlib
+import re
+
+import telemetry
+from config import REWRITE_CACHE_SIZE, REWRITE_MIN_WORDS
+from query_cache import TTLCache, normalize_question
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Words that only make sense with the previous turn in mind
+_REFERENCE_WORDS = {
+    "it", "its", "they", "them", "their", "theirs", "this", "that", "these", "those",
+    "he", "him", "his", "she", "her", "hers", "former", "latter", "above", "same",
+    "previous", "earlier", "also", "else", "another", "other", "more", "one", "ones",
+}
+# Question scaffolding that says nothing about the topic
+_FUNCTION_WORDS = {
+    "what", "which", "who", "whom", "when", "where", "why", "how", "is", "are", "was", "were",
+    "do", "does", "did", "can", "could", "should", "would", "will", "the", "a", "an", "of",
+    "for", "to", "in", "on", "with", "about", "there", "any", "i", "me", "my", "you", "please", "tell",
+}
+_CONTINUATIONS = ("and ", "but ", "or ", "so ", "then ", "what about", "how about", "why not", "what else")
+
+
+class QuestionRewriter:
+    """
+    Decides locally whether a follow-up question needs to be rewritten
+    against the chat history, and only then asks the LLM to do it.
+
+    Questions with no reference words ("it", "those", "also", ...), that do
+    not open as a continuation ("and ...", "what about ...") and name at
+    least `min_words` topic words (beyond "what is the ...") are treated as
+    self-contained and used as is.
+    Rewrites go to `llm` (meant to be a small, fast model) and are cached
+    per question and most recent human/AI exchange.
+    """
+
+    def __init__(self, llm, min_words=REWRITE_MIN_WORDS, cache=None):
+        self.llm = llm
+        self.min_words = min_words
+        self.cache = cache or TTLCache(maxsize=REWRITE_CACHE_SIZE)
+
+    def needs_rewrite(self, question, chat_history):
+        if not chat_history:
+            return False
+        text = question.strip().lower()
+        words = _WORD_RE.findall(text)
+        if sum(word not in _FUNCTION_WORDS for word in words) < self.min_words:
+            return True
+        if text.startswith(_CONTINUATIONS):
+            return True
+        return any(word in _REFERENCE_WORDS for word in words)
+
+    def cache_key(self, question, chat_history, last_exchange=None):
+        # The last exchange carries almost all of what a rewrite resolves;
+        # without it the whole history has to match
+        context = "\n".join(last_exchange) if last_exchange is not None else chat_history.strip()
+        return normalize_question(question), context
+
+    async def arewrite(self, question, chat_history, llm_limiter=None, last_exchange=None):
+        """
+        Standalone version of `question` (the question itself when no
+        rewrite is needed). `last_exchange` is the latest human and AI
+        message, one string each, used for the cache key.
+        """
+        if not self.needs_rewrite(question, chat_history):
+            telemetry.count("rewrites", result="skipped")
+            return question
+        key = self.cache_key(question, chat_history, last_exchange)
+        rewritten = self.cache.get(key)
+        if rewritten is not None:
+            telemetry.count("rewrites", result="cached")
+            return rewritten
+        from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+
+        condense_prompt = CONDENSE_QUESTION_PROMPT.format(chat_history=chat_history, question=question)
+        async with llm_limiter or contextlib.nullcontext():
+            with telemetry.span("condense"):
+                rewritten = (await self.llm.ainvoke(condense_prompt)).content.strip() or question
+        telemetry.count("rewrites", result="llm")
+        self.cache.set(key, rewritten)
+        return rewritten
@@ -0,0 +1,70 @@
+# reranker.py
+
+import threading
+
+from config import RERANK_MODEL, RERANK_FETCH_K, RERANK_TOKEN_BUDGET, RERANK_MIN_SCORE
+from context_packer import count_tokens
+from qa_pipeline import doc_chunk_id
+from query_cache import TTLCache, normalize_question
+
+
+class CrossEncoderReranker:
+    """
+    Re-rank retrieved candidates with a CPU cross-encoder.
+
+    All (question, chunk) pairs that are not already cached are scored in a
+    single padded batch. Chunks are then taken best-first until `k` are
+    selected, the token budget would be exceeded or the score falls below
+    `min_score`, so the prompt only carries the strongest context.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, fetch_k=RERANK_FETCH_K,
+                 token_budget=RERANK_TOKEN_BUDGET, min_score=RERANK_MIN_SCORE, cache=None):
+        self.model_name = model_name
+        self.fetch_k = fetch_k
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.cache = cache or TTLCache(maxsize=20_000)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, question, docs):
+        """Cross-encoder scores for `docs`, using cached scores where available"""
+        question_key = normalize_question(question)
+        keys = [(question_key, doc_chunk_id(doc)) for doc in docs]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(question, docs[i].page_content) for i in missing]
+            fresh = self._get_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            for i, score in zip(missing, fresh):
+                scores[i] = float(score)
+                self.cache.set(keys[i], scores[i])
+        return scores
+
+    def rerank(self, question, docs, k):
+        """Best `k` of `docs` for `question` that fit the token budget"""
+        if not docs:
+            return []
+        ranked = sorted(zip(self.score(question, docs), range(len(docs))), reverse=True)
+
+        selected, used_tokens = [], 0
+        for score, i in ranked:
+            if len(selected) >= k:
+                break
+            if self.min_score is not None and score < self.min_score:
+                break
+            tokens = count_tokens(docs[i].page_content)
+            if selected and used_tokens + tokens > self.token_budget:
+                break
+            selected.append(docs[i])
+            used_tokens += tokens
+        return selected
@@ -0,0 +1,327 @@
+# resources.py
+
+import importlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import telemetry
+from config import (
+    EMBED_MODEL, LLM_MODEL, SEMANTIC_CACHE_ENABLED, RERANK_ENABLED, METRICS_PORT, REWRITE_MODEL
+)
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry: every Streamlit session and rerun shares the same
+# embedding model, Chroma client, retriever and Groq client. Modules are
+# imported once per server process, so module globals outlive reruns.
+# Heavy libraries are imported inside the factories below, so importing
+# this module is cheap and the UI can render while warm_up() loads them.
+_lock = threading.RLock()
+_resources = {}
+_factory_locks = {}
+_status = {"state": "cold", "error": None, "started_at": None, "ready_at": None}
+_startup = {}
+_warmup_thread = None
+
+# Imported by the warm-up thread, in the order first queries need them
+_WARM_IMPORTS = (
+    "langchain_community.embeddings", "langchain_groq", "langchain.prompts", "langchain.memory",
+    "langchain_community.vectorstores", "qa_pipeline", "corpora", "answer_service",
+)
+
+
+def _get(name, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        # One lock per resource: a model loading in the warm-up thread must
+        # not hold up sessions that only need the corpus registry
+        with _lock:
+            factory_lock = _factory_locks.setdefault(name, threading.Lock())
+        with factory_lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = factory()
+                with _lock:
+                    _resources[name] = resource
+    return resource
+
+
+def get_embedding_cache():
+    """Shared on-disk embedding cache for the configured model"""
+    from embedding_cache import EmbeddingCache
+
+    return _get("embedding_cache", lambda: EmbeddingCache(EMBED_MODEL))
+
+
+def get_embeddings():
+    """Shared embedding model, consulting the embedding cache first"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from embedding_cache import CachedEmbeddings
+
+    # Stored vectors are L2-normalised at ingestion, so queries must be too
+    return _get("embeddings", lambda: CachedEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name=EMBED_MODEL,
+            encode_kwargs={"normalize_embeddings": True}
+        ),
+        get_embedding_cache()
+    ))
+
+
+def get_corpora():
+    """Shared registry of named corpora; collections open lazily on first query"""
+    from corpora import CorpusRegistry
+
+    return _get("corpora", lambda: CorpusRegistry(get_embeddings))
+
+
+def _selection(corpora):
+    names = get_corpora().names
+    return tuple(sorted(set(corpora) & set(names))) if corpora else tuple(names)
+
+
+def get_searcher(corpora=None):
+    """Searcher over the selected corpora (default: all), fanning out when several are selected"""
+    from corpora import CorpusSearcher
+
+    names = _selection(corpora)
+    return _get(f"searcher:{','.join(names)}", lambda: CorpusSearcher(get_corpora(), names))
+
+
+def get_index_version(corpora=None):
+    """Version id of the selected corpora's live indexes, from their ingestion manifests"""
+    return get_corpora().index_version(_selection(corpora))
+
+
+def get_num_documents(corpora=None):
+    """Number of articles in the selected corpora (0 before the first build)"""
+    registry = get_corpora()
+    return sum(registry.info(name)["num_documents"] for name in _selection(corpora))
+
+
+def get_query_caches():
+    """Shared query embedding / retrieval / answer caches"""
+    from query_cache import QueryCaches
+
+    return _get("query_caches", QueryCaches)
+
+
+def get_semantic_cache():
+    """Shared near-duplicate answer cache, or None unless enabled in config"""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    from semantic_cache import SemanticCache
+
+    return _get("semantic_cache", SemanticCache)
+
+
+def get_reranker():
+    """Shared cross-encoder reranker, or None unless enabled in config"""
+    if not RERANK_ENABLED:
+        return None
+    from reranker import CrossEncoderReranker
+
+    return _get("reranker", CrossEncoderReranker)
+
+
+def get_qa_pipeline(corpora=None):
+    """Shared question-answering pipeline over the selected corpora (default: all)"""
+    from qa_pipeline import QAPipeline
+
+    names = _selection(corpora)
+    return _get(f"qa_pipeline:{','.join(names)}", lambda: QAPipeline(
+        llm=get_llm(),
+        embeddings=get_embeddings(),
+        searcher=get_searcher(names),
+        caches=get_query_caches(),
+        index_version=get_index_version(names),
+        semantic_cache=get_semantic_cache(),
+        reranker=get_reranker(),
+        rewriter=get_question_rewriter(),
+        summary_llm=get_rewrite_llm()
+    ))
+
+
+def get_llm():
+    """Shared Groq chat client"""
+    from langchain_groq import ChatGroq
+
+    return _get("llm", lambda: ChatGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        model_name=LLM_MODEL
+    ))
+
+
+def get_evaluator():
+    """Shared answer evaluator (scores are cached per gold/answer pair)"""
+    from evaluation import Evaluator
+
+    # Uncached model: answers and gold texts would only crowd chunks out of the embedding cache
+    return _get("evaluator", lambda: Evaluator(get_embeddings().embeddings))
+
+
+def get_rewrite_llm():
+    """Shared Groq client for follow-up rewriting (a smaller model unless REWRITE_MODEL is None)"""
+    if not REWRITE_MODEL or REWRITE_MODEL == LLM_MODEL:
+        return get_llm()
+    from langchain_groq import ChatGroq
+
+    return _get("rewrite_llm", lambda: ChatGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        model_name=REWRITE_MODEL
+    ))
+
+
+def get_question_rewriter():
+    """Shared follow-up rewriter; its cache survives index rebuilds"""
+    from question_rewriter import QuestionRewriter
+
+    return _get("question_rewriter", lambda: QuestionRewriter(get_rewrite_llm()))
+
+
+def get_answer_service():
+    """Shared asyncio answering service (always uses the current pipeline)"""
+    from answer_service import AnswerService
+
+    return _get("answer_service", lambda: AnswerService(get_qa_pipeline))
+
+
+def get_metrics_server():
+    """Shared /metrics and /traces HTTP endpoint, or None unless METRICS_PORT is set"""
+    if METRICS_PORT is None:
+        return None
+    return _get("metrics_server", lambda: telemetry.start_metrics_server(METRICS_PORT))
+
+
+def get_ingest_worker():
+    """Shared background ingestion worker; switches the app to each new index version it builds"""
+    from ingest_worker import IngestionWorker
+
+    return _get("ingest_worker", lambda: IngestionWorker(
+        get_corpora().root, get_embeddings, on_swap=lambda job: reset_corpus(job.name)
+    ))
+
+
+def submit_ingestion(name):
+    """Queue a refresh of corpus `name` from its archive (returns the IngestJob)"""
+    registry = get_corpora()
+    return get_ingest_worker().submit(registry.zip_paths[name], registry.store_root(name), name)
+
+
+def reset_corpus(name=None):
+    """Drop the open collection of corpus `name` (default: all) and what was built on it after its index changed on disk"""
+    with _lock:
+        registry = _resources.get("corpora")
+        if registry is not None:
+            for corpus in ([name] if name else registry.names):
+                registry.invalidate(corpus)
+        # Pipelines hold the index version of their selection; searchers resolve lazily
+        for key in [key for key in _resources if key.startswith("qa_pipeline:")]:
+            _resources.pop(key)
+        caches = _resources.get("query_caches")
+        if caches is not None:
+            caches.invalidate()
+        semantic_cache = _resources.get("semantic_cache")
+        if semantic_cache is not None:
+            semantic_cache.clear()
+        # Chunk ids survive re-ingestion, so scores of the old texts must go too
+        reranker = _resources.get("reranker")
+        if reranker is not None:
+            reranker.cache.clear()
+
+
+def record_startup(stage, seconds):
+    """Keep the cold-start duration of `stage` (later calls for the same stage are ignored)"""
+    with _lock:
+        _startup.setdefault(stage, seconds)
+
+
+@contextmanager
+def _startup_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup(stage, time.perf_counter() - start)
+
+
+def startup_report():
+    """Seconds spent per cold-start stage: imports, model loading, first render"""
+    with _lock:
+        return dict(_startup)
+
+
+def _open_corpora():
+    # Open indexed collections ahead of the first query (the registry's LRU bounds how many)
+    registry = get_corpora()
+    names = [name for name in registry.names if registry.info(name)["num_documents"]]
+    for name in names[:registry.max_open]:
+        registry.get(name)
+
+
+def _warm_up():
+    try:
+        for module in _WARM_IMPORTS:
+            with _startup_stage(f"import:{module}"):
+                importlib.import_module(module)
+        with _startup_stage("embeddings"):
+            get_embeddings()
+        with _startup_stage("llm"):
+            get_llm()
+        with _lock:
+            _status["state"] = "ready"
+            _status["ready_at"] = time.time()
+            record_startup("time_to_ready", _status["ready_at"] - _status["started_at"])
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        with _lock:
+            _status["state"] = "error"
+            _status["error"] = str(e)
+    else:
+        try:
+            with _startup_stage("open_corpora"):
+                _open_corpora()
+        except Exception:
+            # Not fatal: the first query opens its corpora itself
+            logger.exception("Opening corpora during warm-up failed")
+    telemetry.record_trace("startup", startup_report(), attributes={"state": _status["state"]})
+
+
+def warm_up():
+    """Start loading the heavy resources in the background (once per process)"""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is not None:
+            return
+        _status["state"] = "warming"
+        _status["started_at"] = time.time()
+        _warmup_thread = threading.Thread(target=_warm_up, name="resource-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def is_ready():
+    return _status["state"] == "ready"
+
+
+def health():
+    """Snapshot of the registry state for health/readiness checks"""
+    with _lock:
+        status = dict(_status)
+        status["loaded"] = sorted(_resources)
+        status["startup"] = dict(_startup)
+        registry = _resources.get("corpora")
+        if registry is not None:
+            status["open_corpora"] = registry.open_names()
+        worker = _resources.get("ingest_worker")
+        if worker is not None:
+            status["ingest"] = [job.status() for job in worker.jobs()]
+        caches = _resources.get("query_caches")
+        if caches is not None:
+            status["query_caches"] = caches.stats()
+        semantic_cache = _resources.get("semantic_cache")
+        if semantic_cache is not None:
+            status["semantic_cache"] = {**semantic_cache.stats(), "recent_hits": semantic_cache.audit_log()}
+    return status
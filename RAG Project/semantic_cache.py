@@ -0,0 +1,102 @@
+# semantic_cache.py
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE
+
+
+class SemanticCache:
+    """
+    Near-duplicate answer cache.
+
+    Past standalone questions are kept as normalised embeddings in a fixed
+    size matrix (oldest entries are overwritten first). A new question is
+    served from the cache when its cosine similarity to a stored question
+    reaches `threshold`, the answer type matches and the entry was produced
+    against the same index version. Every hit is recorded in an audit log
+    together with the original question that served it.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, maxsize=SEMANTIC_CACHE_SIZE, audit_size=200):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._entries = [None] * maxsize
+        self._next = 0
+        self._audit = deque(maxlen=audit_size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question, vector, answer_type, index_version):
+        """Return (entry, similarity) for the best matching entry, or None"""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            # Only entries with the same answer type and index version qualify
+            for row in np.argsort(-similarities):
+                similarity = float(similarities[row])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[row]
+                if entry and entry["answer_type"] == answer_type and entry["index_version"] == index_version:
+                    self.hits += 1
+                    self._audit.append({
+                        "question": question,
+                        "matched_question": entry["question"],
+                        "similarity": similarity,
+                        "answer_type": answer_type,
+                        "time": time.time(),
+                    })
+                    return entry, similarity
+            self.misses += 1
+            return None
+
+    def add(self, question, vector, answer, answer_type, chunk_ids, index_version):
+        vector = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            row = self._next
+            self._vectors[row] = vector
+            self._entries[row] = {
+                "question": question,
+                "answer": answer,
+                "answer_type": answer_type,
+                "chunk_ids": list(chunk_ids),
+                "index_version": index_version,
+            }
+            self._next = (row + 1) % self.maxsize
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._entries = [None] * self.maxsize
+            self._next = 0
+
+    def audit_log(self):
+        """Recent hits: which question was served by which cached question"""
+        with self._lock:
+            return list(self._audit)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": sum(entry is not None for entry in self._entries),
+        }
@@ -0,0 +1,216 @@
+# telemetry.py
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import TRACE_LOG, LOG_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Modules whose log lines (JSON traces, prompt sizes, ingestion reports) the app prints
+APP_LOGGERS = ("telemetry", "qa_pipeline", "ingestion", "ingest_worker", "resources")
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """
+    Timings and counters of one answered question or ingestion run.
+    Spans with the same name accumulate; `counts` holds token counts and
+    cache hits/misses keyed by (name, labels).
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans = {}
+        self.counts = {}
+        self.attributes = {}
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counts[key] = self.counts.get(key, 0) + amount
+
+    def as_dict(self):
+        counts = {}
+        for (name, labels), value in self.counts.items():
+            label_text = ",".join(f"{k}={v}" for k, v in labels)
+            counts[f"{name}[{label_text}]" if labels else name] = value
+        return {
+            "kind": self.kind, "trace_id": self.trace_id, "started_at": self.started_at,
+            "spans": dict(self.spans), "counts": counts, "attributes": dict(self.attributes),
+        }
+
+
+class MetricsRegistry:
+    """Process-wide Prometheus-style histograms and counters fed by finished traces"""
+
+    def __init__(self, recent=200):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, trace):
+        with self._lock:
+            for stage, seconds in trace.spans.items():
+                key = (trace.kind, stage)
+                buckets, total = self._histograms.get(key, ([0] * len(BUCKETS), [0.0, 0]))
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+                total[0] += seconds
+                total[1] += 1
+                self._histograms[key] = (buckets, total)
+            self._add_counter("traces", (("kind", trace.kind),), 1)
+            for (name, labels), value in trace.counts.items():
+                self._add_counter(name, (("kind", trace.kind),) + labels, value)
+            self.recent.append(trace.as_dict())
+
+    def _add_counter(self, name, labels, value):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def render_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = ["# TYPE rag_stage_seconds histogram"]
+        with self._lock:
+            for (kind, stage), (buckets, (total, count)) in sorted(self._histograms.items()):
+                labels = f'kind="{kind}",stage="{stage}"'
+                for bound, value in zip(BUCKETS, buckets):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'rag_stage_seconds_bucket{{{labels},le="{le}"}} {value}')
+                lines.append(f"rag_stage_seconds_sum{{{labels}}} {total}")
+                lines.append(f"rag_stage_seconds_count{{{labels}}} {count}")
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE rag_{name}_total counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"rag_{name}_total{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def recent_traces(self):
+        with self._lock:
+            return list(self.recent)
+
+
+registry = MetricsRegistry()
+
+
+def configure_logging(level=LOG_LEVEL):
+    """
+    Print the app's own log lines at `level` to stderr, whatever the root
+    logger is set to (once per process; other libraries are left alone).
+    """
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    for name in APP_LOGGERS:
+        app_logger = logging.getLogger(name)
+        if app_logger.handlers:
+            continue
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        app_logger.addHandler(handler)
+        app_logger.setLevel(level)
+        app_logger.propagate = False
+
+
+def finish(trace):
+    """Publish a finished trace to the metrics registry and the JSON trace log"""
+    registry.observe(trace)
+    if TRACE_LOG:
+        logger.info(json.dumps(trace.as_dict(), sort_keys=True))
+
+
+@contextmanager
+def start_trace(kind):
+    """Make a new Trace current for the enclosed code (and threads it hands work to)"""
+    trace = Trace(kind)
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add_span("total", time.perf_counter() - start)
+        _current_trace.reset(token)
+        finish(trace)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name` of the current trace (no-op without one)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, time.perf_counter() - start)
+
+
+def count(name, amount=1, **labels):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, amount, **labels)
+
+
+def annotate(**attributes):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def record_trace(kind, spans, counts=None, attributes=None):
+    """Publish a trace for work that was timed elsewhere (e.g. ingestion stage totals)"""
+    trace = Trace(kind)
+    for name, seconds in spans.items():
+        trace.add_span(name, seconds)
+    for name, amount in (counts or {}).items():
+        trace.count(name, amount)
+    trace.attributes.update(attributes or {})
+    finish(trace)
+    return trace
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = registry.render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/traces":
+            body, content_type = json.dumps(registry.recent_traces()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve /metrics (Prometheus text) and /traces (recent traces as JSON) from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
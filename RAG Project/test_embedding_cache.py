@@ -0,0 +1,33 @@
+# test_embedding_cache.py
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def _vectors(*values):
+    return np.array([[value, 0.0] for value in values], dtype=np.float32)
+
+
+def test_batch_crossing_capacity_gets_distinct_rows(tmp_path):
+    cache = EmbeddingCache("model", cache_dir=tmp_path, capacity=4)
+    cache.put_many(["a", "b", "c"], _vectors(1, 2, 3))
+    cache.put_many(["d", "e"], _vectors(4, 5))
+
+    assert len(cache) == 4
+    assert len(set(cache._rows.values())) == 4
+    d, e, a = cache.get_many(["d", "e", "a"])
+    assert d[0] == 4 and e[0] == 5
+    # The least recently used entry is the one evicted
+    assert a is None
+
+
+def test_evicted_entries_survive_reload(tmp_path):
+    cache = EmbeddingCache("model", cache_dir=tmp_path, capacity=2)
+    cache.put_many(["a", "b"], _vectors(1, 2))
+    cache.put_many(["c"], _vectors(3))
+    cache.flush()
+
+    reloaded = EmbeddingCache("model", cache_dir=tmp_path, capacity=2)
+    a, b, c = reloaded.get_many(["a", "b", "c"])
+    assert a is None and b[0] == 2 and c[0] == 3
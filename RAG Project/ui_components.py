@@ -129,6 +129,11 @@ def load_custom_css():
             box-shadow: 0 2px 8px rgba(16, 185, 129, 0.7);
             user-select: none;
         }
+        .generation-stats {
+            color: #6b7280;
+            font-size: 0.75rem;
+            margin: -8px 0 10px 0;
+        }
         .stChatInput > div {
             background: #1f2937 !important;
             border-radius: 25px;
@@ -178,41 +183,148 @@ def render_loading_modal(message="Processing documents..."):
     """, unsafe_allow_html=True)
 
 
-def render_user_message(message):
-    st.markdown(f"""
+def render_ingest_progress(status, label="Building medical knowledge base"):
+    """Progress bar with ETA for a background ingestion job"""
+    detail = f"{status['done']}/{status['total']} articles" if status["total"] else "waiting to start"
+    eta = status["eta"]
+    eta_text = f" · about {int(eta // 60)}m {int(eta % 60):02d}s left" if eta is not None else ""
+    st.progress(min(status["percent"], 1.0), text=f"{label}: {status['percent']:.0%} ({detail}){eta_text}")
+
+
+def render_warmup_status(status):
+    """Note under the header while the models load in the background"""
+    if status["state"] == "error":
+        st.error(f"❌ Could not load the language models: {status['error']}")
+    elif status["state"] != "ready":
+        st.info("⏳ Loading language models in the background...")
+
+
+def render_timing_report(startup, ingest_reports):
+    """Sidebar expander with the cold-start stage timings and the last ingestion report of each corpus"""
+    if not startup and not ingest_reports:
+        return
+    with st.sidebar.expander("⏱️ Startup & Ingestion Timings"):
+        if startup:
+            st.markdown("**Startup**\n" + "\n".join(
+                f"- {stage}: {seconds:.2f}s" for stage, seconds in startup.items()
+            ))
+        for name, report in ingest_reports.items():
+            lines = [f"- {report['chunks']} chunks at {report['chunks_per_sec']:.1f} chunks/s"]
+            lines += [f"- {stage}: {seconds:.2f}s" for stage, seconds in sorted(report["timings"].items())]
+            st.markdown(f"**Ingestion: {name}**\n" + "\n".join(lines))
+
+
+def user_message_html(message):
+    return f"""
     <div class="user-message">
         <strong>You:</strong> {message}
     </div>
-    """, unsafe_allow_html=True)
+    """
 
 
-def render_ai_message(message, answer_type="Basic Answer"):
-    st.markdown(f"""
+def ai_message_html(message, answer_type="Basic Answer"):
+    return f"""
     <div class="ai-message">
         <div class="answer-badge">{answer_type}</div>
         <div>{message}</div>
     </div>
-    """, unsafe_allow_html=True)
+    """
 
 
-def render_ai_message_with_metrics(message, answer_type, precision, recall, f1):
-    col1, col2 = st.columns([2.5, 1])
-    with col1:
-        st.markdown(f"""
-        <div class="ai-message">
-            <div class="answer-badge">{answer_type}</div>
-            <div>{message}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown(f"""
-        <div class="metrics-card">
-            <h5>📊 Evaluation Metrics</h5>
-            <div style="margin: 8px 0;"><strong>Precision:</strong> {precision:.3f}</div>
-            <div style="margin: 8px 0;"><strong>Recall:</strong> {recall:.3f}</div>
-            <div style="margin: 8px 0;"><strong>F1 Score:</strong> {f1:.3f}</div>
-        </div>
-        """, unsafe_allow_html=True)
+def generation_stats_html(stats):
+    return f"""
+    <div class="generation-stats">
+        ⚡ First token {stats["ttft"]:.2f}s · {stats["tokens_per_sec"]:.1f} tokens/s · {stats["tokens"]} tokens
+    </div>
+    """
+
+
+def stage_timings_html(trace):
+    """Per-stage timing breakdown of one answer, slowest stage first"""
+    stages = sorted(
+        ((name, seconds) for name, seconds in trace["spans"].items() if name != "total"),
+        key=lambda item: item[1], reverse=True
+    )
+    breakdown = " · ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in stages)
+    hits = sum(value for key, value in trace["counts"].items() if key.startswith("cache_lookups") and "result=hit" in key)
+    return f"""
+    <div class="generation-stats">
+        ⏱️ {trace["spans"].get("total", 0.0):.2f}s total · {breakdown or "no stages"} · {hits} cache hits
+    </div>
+    """
+
+
+def metrics_card_html(metrics):
+    similarity = ""
+    if metrics.get("similarity") is not None:
+        similarity = f'<div style="margin: 8px 0;"><strong>Embedding Similarity:</strong> {metrics["similarity"]:.3f}</div>'
+    return f"""
+    <div class="metrics-card">
+        <h5>📊 Evaluation Metrics</h5>
+        <div style="margin: 8px 0;"><strong>Precision:</strong> {metrics['precision']:.3f}</div>
+        <div style="margin: 8px 0;"><strong>Recall:</strong> {metrics['recall']:.3f}</div>
+        <div style="margin: 8px 0;"><strong>F1 Score:</strong> {metrics['f1']:.3f}</div>
+        <div style="margin: 8px 0;"><strong>Exact Match:</strong> {'Yes' if metrics['exact_match'] else 'No'}</div>
+        <div style="margin: 8px 0;"><strong>ROUGE-L:</strong> {metrics['rouge_l']:.3f}</div>
+        {similarity}
+    </div>
+    """
+
+
+def render_user_message(message):
+    st.markdown(user_message_html(message), unsafe_allow_html=True)
+
+
+def render_ai_message(message, answer_type="Basic Answer", placeholder=None):
+    """Render an AI bubble; pass an st.empty() placeholder to update it in place while streaming"""
+    (placeholder or st).markdown(ai_message_html(message, answer_type), unsafe_allow_html=True)
+
+
+def chat_message_html(record, show_timings=True):
+    """
+    (bubble HTML, metrics card HTML or None) for a ChatMessage, built on
+    first use and cached on the record: past turns never change.
+    """
+    if record.html is None:
+        if record.role == "user":
+            record.html = (user_message_html(record.text), None)
+        else:
+            parts = [ai_message_html(record.text, record.answer_type)]
+            if record.generation:
+                parts.append(generation_stats_html(record.generation))
+            if record.trace and show_timings:
+                parts.append(stage_timings_html(record.trace))
+            card = metrics_card_html(record.metrics) if record.metrics else None
+            record.html = ("".join(parts), card)
+    return record.html
+
+
+def render_chat_window(messages, show_timings=True):
+    """
+    Render ChatMessages from their cached HTML. Consecutive messages
+    without a metrics card go out as a single markdown element.
+    """
+    pending = []
+    for record in messages:
+        bubble, card = chat_message_html(record, show_timings)
+        if card is None:
+            pending.append(bubble)
+            continue
+        if pending:
+            st.markdown("".join(pending), unsafe_allow_html=True)
+            pending = []
+        col1, col2 = st.columns([2.5, 1])
+        with col1:
+            st.markdown(bubble, unsafe_allow_html=True)
+        with col2:
+            st.markdown(card, unsafe_allow_html=True)
+    if pending:
+        st.markdown("".join(pending), unsafe_allow_html=True)
+
+
+def create_load_earlier_button(hidden):
+    """Button revealing older turns; returns True when clicked"""
+    return st.button(f"⬆️ Show earlier messages ({hidden} hidden)", key="load_earlier", use_container_width=True)
 
 
 def render_welcome_message():
@@ -265,6 +377,22 @@ def create_chat_controls():
     return st.session_state.answer_type, st.session_state.gold_standard
 
 
+def create_corpus_selector(names):
+    """Sidebar choice of the corpora to search; shown only when there is a choice"""
+    if len(names) <= 1:
+        return names
+    with st.sidebar:
+        st.markdown("**Knowledge Bases:**")
+        selected = st.multiselect(
+            "Search in",
+            options=names,
+            default=names,
+            help="Questions are searched across all selected corpora in parallel",
+            key="corpus_select"
+        )
+    return selected or names
+
+
 def create_clear_chat_button():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
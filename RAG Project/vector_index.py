@@ -0,0 +1,286 @@
+# vector_index.py
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import (
+    VECTOR_INDEX_MODE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF,
+    IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS
+)
+from hybrid_retriever import iter_collection
+
+INDEX_DIR = "ann"
+
+# Below 2**_PQ_MIN_BITS vectors product quantization is pointless and the
+# IVF-PQ mode stores a flat (exact) faiss index instead
+_PQ_MIN_BITS = 4
+
+
+def _require(module_name, package):
+    try:
+        return __import__(module_name)
+    except ImportError as e:
+        raise ImportError(
+            f"Vector index mode needs the '{package}' package: pip install {package}"
+        ) from e
+
+
+class ExactIndex:
+    """Brute-force inner-product search over a memory-mapped float32 matrix"""
+
+    mode = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors, path):
+        matrix = np.lib.format.open_memmap(path / "vectors.npy", mode="w+", dtype=np.float32, shape=vectors.shape)
+        matrix[:] = vectors
+        matrix.flush()
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path / "vectors.npy", mmap_mode="r"))
+
+    def search(self, vector, k):
+        scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(scores))
+        if k == 0:
+            return [], []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top.tolist(), scores[top].tolist()
+
+
+class HNSWIndex:
+    """Graph index (hnswlib); `ef` trades recall for latency at query time"""
+
+    mode = "hnsw"
+
+    def __init__(self, index, ef=HNSW_EF):
+        self.index = index
+        self.set_ef(ef)
+
+    def set_ef(self, ef):
+        self.ef = ef
+        self.index.set_ef(ef)
+
+    @classmethod
+    def build(cls, vectors, path, M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef=HNSW_EF):
+        hnswlib = _require("hnswlib", "chroma-hnswlib")
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=M)
+        index.add_items(vectors, np.arange(len(vectors)))
+        index.save_index(str(path / "hnsw.bin"))
+        return cls(index, ef)
+
+    @classmethod
+    def load(cls, path, ef=HNSW_EF):
+        hnswlib = _require("hnswlib", "chroma-hnswlib")
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        index = hnswlib.Index(space="ip", dim=meta["dim"])
+        index.load_index(str(path / "hnsw.bin"), max_elements=meta["count"])
+        return cls(index, ef)
+
+    def search(self, vector, k):
+        k = min(k, self.index.get_current_count())
+        if k == 0:
+            return [], []
+        self.index.set_ef(max(self.ef, k))
+        labels, distances = self.index.knn_query(np.asarray(vector, dtype=np.float32), k=k)
+        return labels[0].tolist(), (1.0 - distances[0]).tolist()
+
+
+class IVFPQIndex:
+    """Inverted-file index with product quantization (faiss); `nprobe` trades recall for latency"""
+
+    mode = "ivfpq"
+
+    def __init__(self, index, nprobe=IVF_NPROBE):
+        self.index = index
+        self.set_nprobe(nprobe)
+
+    def set_nprobe(self, nprobe):
+        self.nprobe = nprobe
+        # Flat fallback index of a small collection has no lists to probe
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, path, nlist=IVF_NLIST, m=PQ_M, nbits=PQ_NBITS, nprobe=IVF_NPROBE):
+        faiss = _require("faiss", "faiss-cpu")
+        dim = vectors.shape[1]
+        # Each PQ codebook needs at least 2**nbits training points
+        nbits = min(nbits, int(np.log2(len(vectors))) if len(vectors) else 0)
+        if nbits < _PQ_MIN_BITS:
+            index = faiss.IndexFlatIP(dim)
+        else:
+            # faiss wants ~39 training points per list and m must divide dim
+            nlist = max(1, min(nlist, len(vectors) // 39))
+            while dim % m:
+                m -= 1
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        index.add(vectors)
+        faiss.write_index(index, str(path / "ivfpq.faiss"))
+        return cls(index, nprobe)
+
+    @classmethod
+    def load(cls, path, nprobe=IVF_NPROBE):
+        faiss = _require("faiss", "faiss-cpu")
+        return cls(faiss.read_index(str(path / "ivfpq.faiss")), nprobe)
+
+    def search(self, vector, k):
+        # Instances built for an nprobe sweep share one faiss index
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = self.nprobe
+        scores, labels = self.index.search(np.asarray(vector, dtype=np.float32)[None, :], k)
+        hits = [(int(label), float(score)) for label, score in zip(labels[0], scores[0]) if label >= 0]
+        return [label for label, _ in hits], [score for _, score in hits]
+
+
+INDEX_TYPES = {cls.mode: cls for cls in (ExactIndex, HNSWIndex, IVFPQIndex)}
+
+
+def load_collection_vectors(vectordb):
+    """All chunk ids and embeddings stored in the Chroma collection"""
+    ids, vectors = [], []
+    for page in iter_collection(vectordb, include=("embeddings",)):
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return ids, matrix
+
+
+def load_or_build_index(vectordb, db_dir, index_version, mode=VECTOR_INDEX_MODE):
+    """
+    Open the persisted `mode` index under <db_dir>/ann/<mode>, rebuilding it
+    from the Chroma collection when it is missing or from an older index
+    version. Returns (index, chunk_ids).
+    """
+    index_type = INDEX_TYPES[mode]
+    path = Path(db_dir) / INDEX_DIR / mode
+    meta_path = path / "meta.json"
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("index_version") == index_version:
+            ids = json.loads((path / "ids.json").read_text(encoding="utf-8"))
+            return index_type.load(path), ids
+
+    ids, vectors = load_collection_vectors(vectordb)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    (path / "ids.json").write_text(json.dumps(ids), encoding="utf-8")
+    index = index_type.build(vectors, path)
+    meta = {"index_version": index_version, "mode": mode, "count": len(ids),
+            "dim": int(vectors.shape[1]) if len(ids) else 0}
+    # Written last: an interrupted build is redone on the next start
+    tmp_path = meta_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_path, meta_path)
+    return index, ids
+
+
+class IndexedSearcher:
+    """Dense search through a VectorIndex; texts and metadata come from Chroma"""
+
+    def __init__(self, vectordb, index, chunk_ids):
+        self.vectordb = vectordb
+        self.index = index
+        self.chunk_ids = chunk_ids
+
+    def search(self, question, vector, k):
+        rows, _ = self.index.search(vector, k)
+        ids = [self.chunk_ids[row] for row in rows]
+        if not ids:
+            return []
+        from langchain.schema import Document
+
+        page = self.vectordb.get(ids=ids, include=["documents", "metadatas"])
+        docs_by_id = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+        }
+        return [docs_by_id[chunk_id] for chunk_id in ids if chunk_id in docs_by_id]
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def recall_report(vectors, indexes, k=10, num_queries=200, seed=0):
+    """
+    Recall@k and latency of each index against exact search, using stored
+    vectors as queries. `indexes` maps a label to an index object.
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    exact = ExactIndex(vectors)
+    truth = [set(exact.search(query, k)[0]) for query in queries]
+
+    report = {}
+    for label, index in indexes.items():
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            rows, _ = index.search(query, k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(expected & set(rows)) / len(expected) if expected else 1.0)
+        report[label] = {
+            f"recall@{k}": float(np.mean(recalls)),
+            "p50_ms": _percentile(latencies, 50),
+            "p99_ms": _percentile(latencies, 99),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of the vector index modes")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["exact", "hnsw", "ivfpq"])
+    parser.add_argument("--ef", nargs="+", type=int, default=[16, 64, 256], help="HNSW ef values to sweep")
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[4, 16, 64], help="IVF nprobe values to sweep")
+    parser.add_argument("--corpus", help="Corpus to measure (default: the first configured one)")
+    args = parser.parse_args()
+
+    import resources
+
+    registry = resources.get_corpora()
+    corpus = registry.get(args.corpus or registry.names[0])
+    vectordb, index_version = corpus.vectordb, corpus.index_version
+    _, vectors = load_collection_vectors(vectordb)
+
+    indexes = {}
+    for mode in args.modes:
+        try:
+            index, _ = load_or_build_index(vectordb, corpus.store_dir, index_version, mode)
+        except ImportError as e:
+            print(f"skipping {mode}: {e}")
+            continue
+        if mode == "hnsw":
+            for ef in args.ef:
+                indexes[f"hnsw ef={ef}"] = HNSWIndex(index.index, ef)
+        elif mode == "ivfpq":
+            for nprobe in args.nprobe:
+                indexes[f"ivfpq nprobe={nprobe}"] = IVFPQIndex(index.index, nprobe)
+        else:
+            indexes[mode] = index
+
+    report = recall_report(vectors, indexes, k=args.k, num_queries=args.queries)
+    print(f"{'index':<22}{'recall@' + str(args.k):>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, row in report.items():
+        print(f"{label:<22}{row[f'recall@{args.k}']:>12.3f}{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()